@@ -14,6 +14,16 @@ Example: "what is quantum computing !!ask"
 
 import os
 import re
+import time
+import atexit
+import asyncio
+import hashlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import httpx
 
 from searx.plugins import Plugin
 from searx.result_types import Answer
@@ -25,6 +35,78 @@ OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstr
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 QUICK_ANSWER_TIMEOUT = float(os.getenv("SEARXNG_AI_QUICK_TIMEOUT", "5.0"))
+CACHE_SIZE = int(os.getenv("SEARXNG_AI_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("SEARXNG_AI_CACHE_TTL", "3600"))
+SNIPPET_MIN_CHARS = 200
+
+# Definitional questions that an encyclopedia-style snippet already answers
+_DEFINITION_RE = re.compile(r"^(?:what\s+(?:is|are)|who\s+(?:is|was)|define)\b", re.IGNORECASE)
+# Engines mark cut-off snippets with an ellipsis
+_TRUNCATED_RE = re.compile(r"(?:\.\.\.|\u2026)\s*$")
+
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: bytes, value: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+# Successful answers only; errors are retried on the next query
+_ANSWER_CACHE = _TTLCache(CACHE_SIZE, CACHE_TTL)
+_TEMPERATURE = 0.3
+
+
+# One event loop running in a background thread, shared by all SearXNG worker
+# threads, plus the HTTP/2 client bound to it; the connection to the LLM
+# endpoint stays warm across queries
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_CLIENT: Optional[httpx.AsyncClient] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _background_loop() -> Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]:
+    global _LOOP, _CLIENT
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _CLIENT = httpx.AsyncClient(http2=True, timeout=QUICK_ANSWER_TIMEOUT)
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="ai-quick-answer-loop", daemon=True).start()
+        return _LOOP, _CLIENT
+
+
+@atexit.register
+def _close_loop() -> None:
+    if _LOOP is None or not _LOOP.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_CLIENT.aclose(), _LOOP).result(5)
+    finally:
+        _LOOP.call_soon_threadsafe(_LOOP.stop)
 
 
 def _strip_trigger(q: str) -> str:
@@ -32,18 +114,17 @@ def _strip_trigger(q: str) -> str:
     return q.replace(TRIGGER, "").strip()
 
 
-def _get_quick_answer(query: str) -> str:
+async def _get_quick_answer_async(client: httpx.AsyncClient, query: str) -> str:
     """
     Get a quick AI answer using only the search snippets.
     
     Args:
+        client: HTTP client
         query: User's search query
         
     Returns:
         AI-generated quick answer
     """
-    import requests
-    
     prompt = f"""Provide a concise, accurate answer to the following question.
 
 Question: {query}
@@ -57,8 +138,13 @@ Requirements:
 
 Answer:"""
 
+    key = hashlib.sha256(f"{OPENAI_MODEL}|{_TEMPERATURE}|{prompt}".encode()).digest()
+    cached = _ANSWER_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        r = requests.post(
+        r = await client.post(
             f"{OPENAI_BASE_URL}/chat/completions",
             headers={
                 "Authorization": f"Bearer {OPENAI_API_KEY}",
@@ -70,16 +156,57 @@ Answer:"""
                     {"role": "system", "content": "You are a helpful assistant that provides accurate, concise answers to questions."},
                     {"role": "user", "content": prompt},
                 ],
-                "temperature": 0.3,
+                "temperature": _TEMPERATURE,
                 "max_tokens": 500,
             },
-            timeout=QUICK_ANSWER_TIMEOUT,
         )
         r.raise_for_status()
-        return r.json()["choices"][0]["message"]["content"].strip()
+        answer = r.json()["choices"][0]["message"]["content"].strip()
     except Exception as e:
         return f"Unable to generate quick answer: {str(e)}"
 
+    _ANSWER_CACHE.set(key, answer)
+    return answer
+
+
+def _snippet_answer(query: str, results: list) -> Optional[Tuple[str, str]]:
+    """
+    Pick a search snippet that already answers a definitional query.
+    
+    Args:
+        query: Clean user query (trigger removed)
+        results: SearXNG results, best first
+        
+    Returns:
+        (snippet, url) for the first of the top 3 results whose snippet is
+        long enough and made of complete sentences, or None if the LLM
+        should be asked instead. Results without a URL are skipped, since
+        the snippet has to be shown with its source.
+    """
+    if not _DEFINITION_RE.match(query):
+        return None
+    for result in results[:3]:
+        url = getattr(result, "url", "")
+        if not url:
+            continue
+        snippet = " ".join((getattr(result, "content", "") or "").split())
+        if len(snippet) < SNIPPET_MIN_CHARS or _TRUNCATED_RE.search(snippet):
+            continue
+        if snippet[-1] in ".!?":
+            return snippet, url
+    return None
+
+
+def _get_quick_answer(query: str) -> str:
+    """Blocking wrapper around `_get_quick_answer_async` for `post_search`."""
+    loop, client = _background_loop()
+    future = asyncio.run_coroutine_threadsafe(_get_quick_answer_async(client, query), loop)
+    try:
+        return future.result(QUICK_ANSWER_TIMEOUT * 2)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
 
 class SXNGPlugin(Plugin):
     name = "ai_quick_answer"
@@ -100,15 +227,26 @@ class SXNGPlugin(Plugin):
         # Get clean query
         clean_q = _strip_trigger(q)
         
-        # Generate quick answer
+        # An engine already answered the query; no need to ask the LLM
+        if result_container.answers:
+            return
+        
+        # Generate quick answer, preferring a snippet that already answers it
         try:
-            answer_text = _get_quick_answer(clean_q)
+            snippet = _snippet_answer(clean_q, result_container.results)
+            if snippet is None:
+                title = "AI Quick Answer"
+                answer_text = _get_quick_answer(clean_q)
+            else:
+                # Not model output: say so, and where it came from
+                title = "Quick Answer (from search results)"
+                answer_text = f"{snippet[0]}\n\nSource: {snippet[1]}"
             
             # Add answer to results
             result_container.answers.append(
                 Answer(
                     answer_type="general",
-                    title="AI Quick Answer",
+                    title=title,
                     content=answer_text
                 )
             )
@@ -1,13 +1,23 @@
 import os
 import re
-import json
+import time
+import atexit
 import asyncio
-from typing import List, Tuple, Optional, Dict
-from collections import Counter
+import hashlib
+import threading
+import concurrent.futures
+from functools import lru_cache
+from typing import List, Tuple, Optional, Dict, FrozenSet, Pattern
+from urllib.parse import urlsplit
+from collections import OrderedDict
+from html import unescape
 from html.parser import HTMLParser
 
 import httpx
+import orjson
 import trafilatura
+from lxml import etree
+from trafilatura.settings import Extractor, use_config
 
 from searx.plugins import Plugin
 from searx.result_types import Answer
@@ -26,15 +36,33 @@ OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 # Limits
 RESULTS_FOR_SELECTION = int(os.getenv("SEARXNG_AI_RESULTS_FOR_SELECTION", "40"))  # snippets considered
 SELECT_K = int(os.getenv("SEARXNG_AI_SELECT_K", "12"))  # urls LLM returns
+# 0 = rank snippets locally (one LLM call per query), 1 = ask the LLM to pick URLs first
+LLM_SELECT = os.getenv("SEARXNG_AI_LLM_SELECT", "0") == "1"
 FETCH_K = int(os.getenv("SEARXNG_AI_FETCH_K", "7"))    # urls we actually fetch
 
+FETCH_CONCURRENCY = int(os.getenv("SEARXNG_AI_FETCH_CONCURRENCY", "5"))  # pages fetched at once
+FETCH_PER_HOST = int(os.getenv("SEARXNG_AI_FETCH_PER_HOST", "2"))  # ... of which from one host
+
 FETCH_TIMEOUT = float(os.getenv("SEARXNG_AI_FETCH_TIMEOUT", "4.0"))
 FETCH_MAX_BYTES = int(os.getenv("SEARXNG_AI_FETCH_MAX_BYTES", "700000"))
 EXTRACT_MAX_CHARS = int(os.getenv("SEARXNG_AI_EXTRACT_MAX_CHARS", "9000"))
+# 1 = try a regex scan of paragraph-level blocks before parsing the whole page
+REGEX_EXTRACT = os.getenv("SEARXNG_AI_REGEX_EXTRACT", "0") == "1"
+
+# Total size of the SOURCES block sent to the summarizer, in (estimated) tokens
+SOURCES_MAX_TOKENS = int(os.getenv("SEARXNG_AI_SOURCES_MAX_TOKENS", "8000"))
+# Rough chars/token for prose; OPENAI_MODEL may be any gateway model, so no tokenizer
+CHARS_PER_TOKEN = 4
 
 SELECT_TIMEOUT = float(os.getenv("SEARXNG_AI_SELECT_TIMEOUT", "7.0"))
 SUMMARIZE_TIMEOUT = float(os.getenv("SEARXNG_AI_SUMMARIZE_TIMEOUT", "12.0"))
 
+# LLM response cache (entries, seconds); size 0 disables caching
+CACHE_SIZE = int(os.getenv("SEARXNG_AI_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("SEARXNG_AI_CACHE_TTL", "3600"))
+# How long an LLM URL selection is reused for the same query and result hosts
+SELECT_CACHE_TTL = float(os.getenv("SEARXNG_AI_SELECT_CACHE_TTL", "86400"))
+
 UA = os.getenv("SEARXNG_AI_UA", "Mozilla/5.0 (compatible; SearXNG-AI/1.0)")
 
 
@@ -46,10 +74,10 @@ class ContentAnalyzer(HTMLParser):
     """Advanced HTML analyzer for content density and relevance scoring."""
     
     # Tags to exclude (ads, navigation, footers, etc.)
-    EXCLUDED_TAGS = {
+    EXCLUDED_TAGS = frozenset({
         'nav', 'header', 'footer', 'aside', 'script', 'style', 'iframe',
         'noscript', 'form', 'button', 'input', 'select', 'textarea'
-    }
+    })
     
     # Low-value class/id patterns (ads, navigation, social, etc.)
     EXCLUDED_PATTERNS = [
@@ -72,9 +100,11 @@ class ContentAnalyzer(HTMLParser):
         r'subscribe',
         r'newsletter',
     ]
+    # All of the above as one alternation: a single C-level scan per attribute
+    EXCLUDED_RE = re.compile('|'.join(EXCLUDED_PATTERNS))
     
     # High-value tags for main content
-    CONTENT_TAGS = {'article', 'main', 'section', 'div', 'p'}
+    CONTENT_TAGS = frozenset({'article', 'main', 'section', 'div', 'p'})
     
     def __init__(self):
         super().__init__()
@@ -83,6 +113,8 @@ class ContentAnalyzer(HTMLParser):
         self.current_tag_stack = []
         self.in_excluded = False
         self.excluded_depth = 0
+        # Raw text seen since the last lxml start/end event (see data())
+        self.pending_data = []
         
     def handle_starttag(self, tag, attrs):
         self.current_tag_stack.append(tag)
@@ -98,14 +130,16 @@ class ContentAnalyzer(HTMLParser):
             self.excluded_depth = 1
             return
             
-        # Check class/id patterns for excluded content
-        attrs_dict = dict(attrs)
-        for attr_name in ['class', 'id']:
-            attr_value = attrs_dict.get(attr_name, '').lower()
-            if any(re.search(pattern, attr_value) for pattern in self.EXCLUDED_PATTERNS):
-                self.in_excluded = True
-                self.excluded_depth = 1
-                return
+        # Check class/id patterns for excluded content, in one regex call
+        cls = idv = ''
+        for name, value in attrs:
+            if name == 'class':
+                cls = value or ''
+            elif name == 'id':
+                idv = value or ''
+        if (cls or idv) and self.EXCLUDED_RE.search(f"{cls} {idv}".lower()):
+            self.in_excluded = True
+            self.excluded_depth = 1
     
     def handle_endtag(self, tag):
         # Remove from stack if it matches (handle malformed HTML gracefully)
@@ -135,6 +169,85 @@ class ContentAnalyzer(HTMLParser):
             text = data.strip()
             if text:
                 self.current_block.append(text)
+    
+    # lxml parser-target interface: lets lxml's C tokenizer drive the same
+    # handlers that HTMLParser.feed() would call (see _parse_content_blocks)
+    def start(self, tag, attrib):
+        self._flush_data()
+        self.handle_starttag(tag, attrib.items())
+    
+    def end(self, tag):
+        self._flush_data()
+        self.handle_endtag(tag)
+    
+    def data(self, data):
+        # lxml splits a text node at every entity reference ("caf", "é"),
+        # so pieces are joined unstripped and handled as one text run
+        self.pending_data.append(data)
+    
+    def _flush_data(self):
+        if self.pending_data:
+            self.handle_data(''.join(self.pending_data))
+            self.pending_data = []
+
+
+def _parse_content_blocks(html: str) -> List[str]:
+    """
+    Run ContentAnalyzer over a page using lxml's C HTML parser.
+    
+    Tokenizing in C is several times faster than html.parser on large pages,
+    and lxml emits end events for void and implicitly closed elements, so an
+    unclosed <input> no longer hides the rest of the page.
+    """
+    analyzer = ContentAnalyzer()
+    parser = etree.HTMLParser(target=analyzer)
+    parser.feed(html)
+    parser.close()
+    return analyzer.content_blocks
+
+
+_WORD_RE = re.compile(r'\b\w+\b')
+_WS_RE = re.compile(r"\s+")
+
+# Paragraph-level elements and their inner HTML, for the regex fast path.
+# The body stops at the next opening or closing tag of the same name, so an
+# unclosed <p> or <li> (valid HTML) fails at the next sibling instead of
+# scanning to the end of the page, which made the search quadratic.
+_BLOCK_RE = re.compile(
+    r'<(p|article|section|li|h[1-6])\b[^>]*>([^<]*(?:<(?!/?\1\b)[^<]*)*)</\1\s*>',
+    re.IGNORECASE,
+)
+_TAG_RE = re.compile(r'<[^>]+>')
+
+
+def _regex_content_blocks(html: str) -> List[str]:
+    """
+    Collect text blocks with a single regex pass instead of parsing the page.
+    
+    Only <p>, <article>, <section>, <li> and headings are looked at; nested
+    markup inside them is stripped. Nothing is filtered as navigation or ads,
+    so callers should fall back to `_parse_content_blocks` when this yields
+    too little.
+    """
+    blocks = []
+    for match in _BLOCK_RE.finditer(html):
+        text = ' '.join(unescape(_TAG_RE.sub(' ', match.group(2))).split())
+        if len(text) > 50:  # Minimum block length, as in ContentAnalyzer
+            blocks.append(text)
+    return blocks
+
+
+# Characters that are neither alphanumeric nor whitespace: as a bytes.translate
+# delete table for ASCII text, and as a regex for everything else
+_ASCII_NOISE = bytes(i for i in range(128) if not (chr(i).isalnum() or chr(i).isspace()))
+_NOISE_RE = re.compile(r'[^\w\s]|_')
+
+
+def _alnum_space_count(text: str) -> int:
+    """Count alphanumeric and whitespace characters without a per-character Python loop."""
+    if text.isascii():
+        return len(text.encode('ascii').translate(None, _ASCII_NOISE))
+    return len(text) - len(_NOISE_RE.findall(text))
 
 
 def _calculate_content_density(text: str) -> float:
@@ -163,8 +276,7 @@ def _calculate_content_density(text: str) -> float:
     sentence_score = min(sentence_endings / max(word_count / WORDS_PER_SENTENCE, 1), 1.0)
     
     # Alphanumeric ratio (prefer text over symbols/noise)
-    # Count alphanumeric and space characters efficiently
-    alnum_chars = sum(c.isalnum() or c.isspace() for c in text)
+    alnum_chars = _alnum_space_count(text)
     alnum_ratio = alnum_chars / length if length > 0 else 0
     
     # Combined score
@@ -178,41 +290,63 @@ def _calculate_content_density(text: str) -> float:
     return density
 
 
-def _calculate_relevance_score(text: str, query: str) -> float:
-    """Calculate relevance score using NLP-inspired techniques."""
+def _query_terms(query: str) -> FrozenSet[str]:
+    """Tokenize a query into the terms used for relevance scoring (> 2 chars)."""
+    return frozenset(t for t in _WORD_RE.findall(query.lower()) if len(t) > 2)
+
+
+@lru_cache(maxsize=256)
+def _term_pattern(query_terms: FrozenSet[str]) -> Pattern:
+    # Whole-word occurrences of any query term, longest first so alternation
+    # doesn't stop at a shorter prefix
+    alternation = '|'.join(sorted(map(re.escape, query_terms), key=len, reverse=True))
+    return re.compile(rf'\b(?:{alternation})\b')
+
+
+def _calculate_relevance_score(text: str, query: str, query_terms: Optional[FrozenSet[str]] = None) -> float:
+    """
+    Calculate relevance score using NLP-inspired techniques.
+    
+    Callers scoring many blocks against one query should pass `query_terms`
+    from `_query_terms(query)` so the query is tokenized only once.
+    """
     if not text or not query:
         return 0.0
     
     text_lower = text.lower()
     query_lower = query.lower()
     
-    # Extract query terms (simple tokenization)
-    query_terms = set(re.findall(r'\b\w+\b', query_lower))
-    query_terms = {t for t in query_terms if len(t) > 2}  # Filter short words
+    if query_terms is None:
+        query_terms = _query_terms(query_lower)
     
     if not query_terms:
         return 0.0
     
-    # Count term frequencies in text
-    text_words = re.findall(r'\b\w+\b', text_lower)
-    text_word_freq = Counter(text_words)
-    
-    # Term frequency score
-    term_matches = sum(text_word_freq.get(term, 0) for term in query_terms)
-    tf_score = min(term_matches / (len(query_terms) * 5), 1.0)
-    
-    # Exact phrase matching bonus
-    phrase_score = 1.0 if query_lower in text_lower else 0.0
-    
-    # Position score (earlier is better)
+    # Position score (earlier is better). These C-level finds run first
+    # because they also tell us whether any term occurs at all: blocks with
+    # no hit - most of a typical page - score 0 without any regex work
     first_match_pos = len(text)
+    found = False
     for term in query_terms:
         pos = text_lower.find(term)
-        if pos != -1 and pos < first_match_pos:
-            first_match_pos = pos
+        if pos != -1:
+            found = True
+            if pos < first_match_pos:
+                first_match_pos = pos
+    
+    if not found:
+        return 0.0
     
     position_score = 1.0 - (first_match_pos / len(text)) if len(text) > 0 else 0.0
     
+    # Term frequency score: count whole-word term hits in one regex scan
+    # rather than building a Counter over every word in the block
+    term_matches = len(_term_pattern(query_terms).findall(text_lower))
+    tf_score = min(term_matches / (len(query_terms) * 5), 1.0)
+    
+    # Exact phrase matching bonus
+    phrase_score = 1.0 if query_lower in text_lower else 0.0
+    
     # Combined relevance score
     relevance = (
         tf_score * 0.5 +
@@ -223,6 +357,58 @@ def _calculate_relevance_score(text: str, query: str) -> float:
     return relevance
 
 
+# Trafilatura fallback settings, built once instead of on every extract() call
+_TRAFILATURA_CONFIG = use_config()
+_TRAFILATURA_CONFIG.set("DEFAULT", "MIN_EXTRACTED_SIZE", "200")
+_TRAFILATURA_OPTIONS = Extractor(
+    config=_TRAFILATURA_CONFIG,
+    comments=False,
+    tables=True,  # Tables can contain useful data
+    precision=True,  # Prefer quality over quantity
+)
+
+
+def _combine_top_blocks(blocks: List[str], query: str, query_terms: FrozenSet[str]) -> str:
+    """
+    Score blocks by density and relevance and join the best ones.
+    
+    Args:
+        blocks: Candidate text blocks
+        query: User query for relevance scoring
+        query_terms: Precomputed `_query_terms(query)`
+        
+    Returns:
+        Top blocks joined by blank lines, at most EXTRACT_MAX_CHARS long
+        (empty if no block clears the quality threshold)
+    """
+    # Score each block by density and relevance
+    scored_blocks = []
+    for block in blocks:
+        density = _calculate_content_density(block)
+        relevance = _calculate_relevance_score(block, query, query_terms)
+        combined_score = density * 0.4 + relevance * 0.6
+        scored_blocks.append((combined_score, block))
+    
+    # Sort by score and take top blocks
+    scored_blocks.sort(reverse=True, key=lambda x: x[0])
+    
+    # Combine top blocks up to character limit
+    extracted = []
+    total_chars = 0
+    for score, block in scored_blocks:
+        if score < 0.1:  # Minimum quality threshold
+            break
+        if total_chars + len(block) > EXTRACT_MAX_CHARS:
+            remaining = EXTRACT_MAX_CHARS - total_chars
+            if remaining > 200:  # Only add if substantial space left
+                extracted.append(block[:remaining])
+            break
+        extracted.append(block)
+        total_chars += len(block)
+    
+    return '\n\n'.join(extracted)
+
+
 def _extract_enhanced(html: str, url: str, query: str) -> Optional[str]:
     """
     Enhanced content extraction with advanced heuristics.
@@ -232,59 +418,36 @@ def _extract_enhanced(html: str, url: str, query: str) -> Optional[str]:
     2. Structural filtering (remove ads, nav, footers)
     3. Relevance scoring against query
     4. Trafilatura as fallback
+    
+    With REGEX_EXTRACT, a regex scan of paragraph-level blocks is tried
+    first and used when it yields at least 500 chars.
     """
     if not html:
         return None
     
+    query_terms = _query_terms(query)
+    
+    # Strategy 0: Regex block scan, skipping the parse entirely
+    if REGEX_EXTRACT:
+        result = _combine_top_blocks(_regex_content_blocks(html), query, query_terms)
+        if len(result) >= 500:
+            return result
+    
     # Strategy 1: Parse with custom analyzer
     try:
-        analyzer = ContentAnalyzer()
-        analyzer.feed(html)
+        content_blocks = _parse_content_blocks(html)
         
-        if analyzer.content_blocks:
-            # Score each block by density and relevance
-            scored_blocks = []
-            for block in analyzer.content_blocks:
-                density = _calculate_content_density(block)
-                relevance = _calculate_relevance_score(block, query)
-                combined_score = density * 0.4 + relevance * 0.6
-                scored_blocks.append((combined_score, block))
-            
-            # Sort by score and take top blocks
-            scored_blocks.sort(reverse=True, key=lambda x: x[0])
-            
-            # Combine top blocks up to character limit
-            extracted = []
-            total_chars = 0
-            for score, block in scored_blocks:
-                if score < 0.1:  # Minimum quality threshold
-                    break
-                if total_chars + len(block) > EXTRACT_MAX_CHARS:
-                    remaining = EXTRACT_MAX_CHARS - total_chars
-                    if remaining > 200:  # Only add if substantial space left
-                        extracted.append(block[:remaining])
-                    break
-                extracted.append(block)
-                total_chars += len(block)
-            
-            if extracted:
-                result = '\n\n'.join(extracted)
-                if len(result) > 100:  # Minimum viable content
-                    return result
-    except (ValueError, TypeError) as e:
+        if content_blocks:
+            result = _combine_top_blocks(content_blocks, query, query_terms)
+            if len(result) > 100:  # Minimum viable content
+                return result
+    except (ValueError, TypeError, etree.LxmlError) as e:
         # Expected errors from HTML parsing - fall through to trafilatura
         pass
     
     # Strategy 2: Fallback to trafilatura with enhanced config
     try:
-        text = trafilatura.extract(
-            html,
-            include_comments=False,
-            include_tables=True,  # Tables can contain useful data
-            no_fallback=False,
-            favor_precision=True,  # Prefer quality over quantity
-            favor_recall=False,
-        )
+        text = trafilatura.extract(html, options=_TRAFILATURA_OPTIONS)
         
         if text:
             # Apply relevance filtering to trafilatura output
@@ -295,7 +458,7 @@ def _extract_enhanced(html: str, url: str, query: str) -> Optional[str]:
                 if len(para.strip()) < 50:
                     continue
                 density = _calculate_content_density(para)
-                relevance = _calculate_relevance_score(para, query)
+                relevance = _calculate_relevance_score(para, query, query_terms)
                 combined_score = density * 0.4 + relevance * 0.6
                 scored_paragraphs.append((combined_score, para))
             
@@ -331,7 +494,7 @@ def _extract_enhanced(html: str, url: str, query: str) -> Optional[str]:
 
 
 def _clean(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "")).strip()
+    return _WS_RE.sub(" ", (s or "")).strip()
 
 def _is_http(url: str) -> bool:
     return url.startswith("http://") or url.startswith("https://")
@@ -339,11 +502,120 @@ def _is_http(url: str) -> bool:
 def _strip_trigger(q: str) -> str:
     return q.replace(TRIGGER, "").strip()
 
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class _TTLCache:
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[bytes, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+    
+    def set(self, key: bytes, value: str) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+_CHAT_CACHE = _TTLCache(CACHE_SIZE, CACHE_TTL)
+_CHAT_TEMPERATURE = 0.2
+
+# LLM URL selections (newline-joined), keyed by `_select_key`
+_SELECT_CACHE = _TTLCache(CACHE_SIZE, SELECT_CACHE_TTL)
+
+
+def _new_client() -> httpx.AsyncClient:
+    """
+    Build the HTTP client shared by every phase of every summarize run.
+
+    LLM calls and page fetches go through the same keep-alive pool, so
+    TCP/TLS handshakes and DNS lookups are reused across phases and across
+    queries. Timeouts default to the fetch budget; LLM calls pass their own
+    per-request timeout.
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        timeout=httpx.Timeout(FETCH_TIMEOUT, connect=FETCH_TIMEOUT),
+        headers={"User-Agent": UA},
+    )
+
+
+# One event loop running in a background thread, shared by all SearXNG worker
+# threads, plus the HTTP client bound to it. Both live for the process, so
+# queries never pay for loop setup and connections stay pooled across them.
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_CLIENT: Optional[httpx.AsyncClient] = None
+_LOOP_LOCK = threading.Lock()
+
+# Upper bound on how long post_search waits for one query's pipeline
+PIPELINE_TIMEOUT = SELECT_TIMEOUT + 2 * FETCH_TIMEOUT + SUMMARIZE_TIMEOUT
+
+
+def _background_loop() -> Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]:
+    global _LOOP, _CLIENT
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _CLIENT = _new_client()
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="ai-summarize-loop", daemon=True).start()
+        return _LOOP, _CLIENT
 
-def _openai_chat(prompt: str, timeout: float) -> str:
+
+def _run_in_loop(coro_fn, *args, timeout: float):
+    """
+    Run `coro_fn(client, *args)` on the background loop and wait for its result.
+    
+    Args:
+        coro_fn: Coroutine function taking the shared HTTP client first
+        *args: Remaining arguments for `coro_fn`
+        timeout: Seconds to wait before cancelling it
+        
+    Returns:
+        The coroutine's result (exceptions, including TimeoutError, propagate)
+    """
+    loop, client = _background_loop()
+    future = asyncio.run_coroutine_threadsafe(coro_fn(client, *args), loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+@atexit.register
+def _close_loop() -> None:
+    if _LOOP is None or not _LOOP.is_running():
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_CLIENT.aclose(), _LOOP).result(5)
+    finally:
+        _LOOP.call_soon_threadsafe(_LOOP.stop)
+
+
+async def _post_chat(client: httpx.AsyncClient, prompt: str, timeout: float) -> str:
     # OpenAI-compatible: POST {base}/chat/completions with Bearer key
-    import requests
-    r = requests.post(
+    r = await client.post(
         f"{OPENAI_BASE_URL}/chat/completions",
         headers={
             "Authorization": f"Bearer {OPENAI_API_KEY}",
@@ -355,28 +627,103 @@ def _openai_chat(prompt: str, timeout: float) -> str:
                 {"role": "system", "content": "Follow instructions exactly. Do not invent facts."},
                 {"role": "user", "content": prompt},
             ],
-            "temperature": 0.2,
+            "temperature": _CHAT_TEMPERATURE,
         },
         timeout=timeout,
     )
     r.raise_for_status()
-    return r.json()["choices"][0]["message"]["content"].strip()
+    return orjson.loads(r.content)["choices"][0]["message"]["content"].strip()
+
+
+# Chat requests currently on the wire, keyed like the cache. Concurrent queries
+# that produce the same prompt wait on the first request instead of paying for
+# their own completion. Thread-safe futures, so callers on other loops can wait too.
+_INFLIGHT: Dict[bytes, concurrent.futures.Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _chat_key(prompt: str) -> bytes:
+    return hashlib.sha256(f"{OPENAI_MODEL}|{_CHAT_TEMPERATURE}|{prompt}".encode()).digest()
+
 
+async def _openai_chat(client: httpx.AsyncClient, prompt: str, timeout: float) -> str:
+    key = _chat_key(prompt)
+    cached = _CHAT_CACHE.get(key)
+    if cached is not None:
+        return cached
 
-def llm_select_urls(query: str, results: list) -> List[str]:
-    # Build compact list of (title, snippet, url) from ALL results
-    items = []
+    with _INFLIGHT_LOCK:
+        shared = _INFLIGHT.get(key)
+        if shared is None:
+            future = _INFLIGHT[key] = concurrent.futures.Future()
+            # running futures can't be cancelled by a waiter giving up
+            future.set_running_or_notify_cancel()
+
+    if shared is not None:
+        return await asyncio.wrap_future(shared)
+
+    try:
+        text = await _post_chat(client, prompt, timeout)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    else:
+        _CHAT_CACHE.set(key, text)
+        future.set_result(text)
+        return text
+    finally:
+        if not future.done():
+            future.set_exception(RuntimeError("chat request was cancelled"))
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+
+
+class _Candidate:
+    """A search result reduced to the fields URL selection needs."""
+    
+    __slots__ = ("url", "host", "title", "snippet", "score")
+    
+    def __init__(self, url: str, host: str, title: str, snippet: str, score: float):
+        self.url = url
+        self.host = host
+        self.title = title
+        self.snippet = snippet
+        self.score = score
+
+
+def _build_candidates(query: str, results: list) -> List[_Candidate]:
+    """
+    Walk the results once, keeping the first RESULTS_FOR_SELECTION HTTP(S)
+    ones with their hostname, cleaned title/snippet and snippet relevance.
+    Both LLM and local selection work from this list.
+    """
+    query_terms = _query_terms(query)
+    candidates = []
     for r in results:
         url = getattr(r, "url", "") or ""
         if not _is_http(url):
             continue
-        items.append({
-            "title": _clean(getattr(r, "title", "") or ""),
-            "snippet": _clean(getattr(r, "content", "") or ""),
-            "url": url,
-        })
+        try:
+            host = _host(url)
+        except ValueError:
+            # malformed (e.g. "http://[bad/"): can't be fetched anyway
+            continue
+        title = _clean(getattr(r, "title", "") or "")
+        snippet = _clean(getattr(r, "content", "") or "")
+        score = _calculate_relevance_score(f"{title} {snippet}", query, query_terms)
+        candidates.append(_Candidate(url, host, title, snippet, score))
+        if len(candidates) >= RESULTS_FOR_SELECTION:
+            break
+    return candidates
+
 
-    items = items[:RESULTS_FOR_SELECTION]
+async def llm_select_urls(client: httpx.AsyncClient, query: str, candidates: List[_Candidate]) -> List[str]:
+    # Compact list of (title, snippet, url); stable URL order keeps the prompt
+    # (and its cache key) independent of engine ordering jitter
+    items = [
+        {"title": c.title, "snippet": c.snippet, "url": c.url}
+        for c in sorted(candidates, key=lambda c: c.url)
+    ]
 
     prompt = f"""
 You are choosing which search results to open to best answer the user.
@@ -395,13 +742,12 @@ Return ONLY valid JSON in this exact shape:
 }}
 
 Search results:
-{json.dumps(items, ensure_ascii=False)}
+{orjson.dumps(items).decode()}
 """.strip()
 
-    txt = _openai_chat(prompt, timeout=SELECT_TIMEOUT)
-
     try:
-        data = json.loads(txt)
+        txt = await _openai_chat(client, prompt, timeout=SELECT_TIMEOUT)
+        data = orjson.loads(txt)
         urls = [u for u in data.get("urls", []) if isinstance(u, str) and _is_http(u)]
         # dedupe keep order
         seen = set()
@@ -415,6 +761,70 @@ Search results:
         return []
 
 
+# Prior credibility of well-known reference hosts (subdomains included),
+# used to break ties between equally relevant snippets
+_CREDIBILITY = {
+    "wikipedia.org": 1.0,
+    "britannica.com": 0.95,
+    "arxiv.org": 0.95,
+    "nature.com": 0.95,
+    "nih.gov": 0.95,
+    "who.int": 0.9,
+    "docs.python.org": 0.9,
+    "developer.mozilla.org": 0.9,
+    "readthedocs.io": 0.85,
+    "stackoverflow.com": 0.8,
+    "github.com": 0.75,
+}
+
+
+@lru_cache(maxsize=4096)
+def _credibility(host: str) -> float:
+    """Credibility prior of `host` or its closest listed parent domain (0.0 if unlisted)."""
+    labels = host.split(":", 1)[0].split(".")
+    for i in range(len(labels) - 1):
+        prior = _CREDIBILITY.get(".".join(labels[i:]))
+        if prior is not None:
+            return prior
+    return 0.0
+
+
+def local_select_urls(candidates: List[_Candidate]) -> List[str]:
+    """
+    Rank candidates by snippet relevance without calling the LLM.
+
+    Keeps at most one URL per hostname for source diversity and returns the
+    top SELECT_K. Ties go to the more credible host (see `_CREDIBILITY`),
+    then keep the engine's original ordering.
+    """
+    ranked = sorted(candidates, key=lambda c: (c.score, _credibility(c.host)), reverse=True)
+
+    selected = []
+    seen_hosts = set()
+    for c in ranked:
+        if c.host in seen_hosts:
+            continue
+        seen_hosts.add(c.host)
+        selected.append(c.url)
+        if len(selected) >= SELECT_K:
+            break
+    return selected
+
+
+def _select_key(query: str, candidates: List[_Candidate]) -> bytes:
+    """Key an LLM selection by normalized query and the set of candidate hosts."""
+    hosts = ",".join(sorted({c.host for c in candidates}))
+    return hashlib.sha256(f"{_clean(query).lower()}|{hosts}".encode()).digest()
+
+
+def _decode_body(body: bytearray, encoding: Optional[str]) -> str:
+    """Decode a fetched body using the Content-Type charset, falling back to UTF-8."""
+    try:
+        return body.decode(encoding or "utf-8", errors="ignore")
+    except LookupError:
+        return body.decode("utf-8", errors="ignore")
+
+
 async def fetch_and_extract(client: httpx.AsyncClient, url: str, query: str) -> Tuple[str, Optional[str]]:
     """
     Fetch and extract content from a URL with enhanced extraction.
@@ -428,13 +838,26 @@ async def fetch_and_extract(client: httpx.AsyncClient, url: str, query: str) ->
         Tuple of (url, extracted_text or None)
     """
     try:
-        resp = await client.get(url, follow_redirects=True)
-        resp.raise_for_status()
+        # Stream the body and stop at FETCH_MAX_BYTES instead of downloading
+        # the whole page and slicing a copy of it afterwards
+        async with client.stream("GET", url, follow_redirects=True) as resp:
+            resp.raise_for_status()
+            body = bytearray()
+            async for chunk in resp.aiter_bytes(chunk_size=16384):
+                body += chunk
+                if len(body) >= FETCH_MAX_BYTES:
+                    break
+            encoding = resp.charset_encoding
 
-        raw = resp.content[:FETCH_MAX_BYTES].decode(errors="ignore")
+        del body[FETCH_MAX_BYTES:]
+        raw = _decode_body(body, encoding)
+        del body
         
-        # Use enhanced extraction with query-aware relevance
-        text = _extract_enhanced(raw, url, query)
+        # Use enhanced extraction with query-aware relevance. Parsing and
+        # scoring are CPU-bound, so they run in a worker thread: the event
+        # loop is shared by every search in this process and must keep
+        # serving sockets and LLM responses meanwhile
+        text = await asyncio.to_thread(_extract_enhanced, raw, url, query)
         
         if not text:
             return (url, None)
@@ -447,26 +870,119 @@ async def fetch_and_extract(client: httpx.AsyncClient, url: str, query: str) ->
         return (url, None)
 
 
-async def fetch_pages(urls: List[str], query: str) -> List[Tuple[str, str]]:
+_NON_WORD_RE = re.compile(r'\W+')
+
+
+def _dedupe_by_content(extracted: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Drop pages whose extracted text duplicates an earlier page.
+    
+    Texts are compared by a SHA-256 of their first 4096 lowercased chars with
+    punctuation and whitespace removed, so mirrors that differ only in
+    formatting collapse to the first URL and don't inflate the prompt.
+    """
+    seen = set()
+    out = []
+    for url, text in extracted:
+        sig = hashlib.sha256(_NON_WORD_RE.sub('', text[:4096].lower()).encode()).digest()
+        if sig in seen:
+            continue
+        seen.add(sig)
+        out.append((url, text))
+    return out
+
+
+def _page_fetcher(client: httpx.AsyncClient, query: str):
+    """
+    Build a `fetch_and_extract` wrapper that shares one set of limits.
+    
+    At most FETCH_CONCURRENCY pages are in flight, and at most FETCH_PER_HOST
+    of them from the same host; further same-host URLs wait their turn
+    rather than queueing on that host's connections.
+    
+    Args:
+        client: HTTP client
+        query: User query for relevance scoring
+        
+    Returns:
+        Coroutine function taking a URL and returning (url, extracted_text)
+    """
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+    host_sems: Dict[str, asyncio.Semaphore] = {}
+    
+    async def fetch_one(url: str) -> Tuple[str, Optional[str]]:
+        try:
+            host = _host(url)
+        except ValueError:
+            # unparseable (e.g. "http://[bad/" from the LLM): fails like any
+            # other unfetchable page instead of aborting the whole gather
+            return (url, None)
+        host_sem = host_sems.setdefault(host, asyncio.Semaphore(FETCH_PER_HOST))
+        # take the host slot first so a same-host wait doesn't hold a global slot
+        async with host_sem, sem:
+            return await fetch_and_extract(client, url, query)
+    
+    return fetch_one
+
+
+async def fetch_pages(
+    client: httpx.AsyncClient,
+    urls: List[str],
+    query: str,
+    fetch_one=None,
+    prefetched: Optional[Dict[str, asyncio.Task]] = None,
+) -> List[Tuple[str, str]]:
     """
     Fetch and extract content from multiple URLs in parallel.
     
+    Concurrency is bounded overall and per host (see `_page_fetcher`).
+    
     Args:
+        client: HTTP client
         urls: List of URLs to fetch
         query: User query for relevance scoring
+        fetch_one: Fetcher from `_page_fetcher`, to share its limits with
+            fetches started elsewhere; a new one is built if omitted
+        prefetched: Already started fetch tasks by URL, awaited instead
+            of fetching those URLs again
         
     Returns:
-        List of (url, extracted_text) tuples for successful extractions
+        List of (url, extracted_text) tuples for successful extractions,
+        with syndicated copies of the same text removed
+    """
+    fetch_one = fetch_one or _page_fetcher(client, query)
+    prefetched = prefetched or {}
+    out = await asyncio.gather(*[prefetched.get(u) or fetch_one(u) for u in urls])
+    return _dedupe_by_content([(u, t) for (u, t) in out if t])
+
+
+def _fit_token_budget(extracted: List[Tuple[str, str]], max_tokens: int) -> List[Tuple[str, str]]:
+    """
+    Trim extracted texts so that together they fit in `max_tokens`.
+    
+    The budget is shared fairly: texts shorter than their share are kept
+    whole and the leftover is split among the longer ones, which are cut
+    to fit. Order of the sources is preserved.
     """
-    timeout = httpx.Timeout(FETCH_TIMEOUT, connect=FETCH_TIMEOUT)
-    headers = {"User-Agent": UA}
-    async with httpx.AsyncClient(timeout=timeout, headers=headers) as client:
-        out = await asyncio.gather(*[fetch_and_extract(client, u, query) for u in urls])
-    return [(u, t) for (u, t) in out if t]
+    remaining = max_tokens * CHARS_PER_TOKEN
+    by_length = sorted(range(len(extracted)), key=lambda i: len(extracted[i][1]))
+    limits = [0] * len(extracted)
+    for n, i in enumerate(by_length):
+        share = remaining // (len(by_length) - n)
+        limits[i] = min(len(extracted[i][1]), share)
+        remaining -= limits[i]
+    
+    out = []
+    for (url, text), limit in zip(extracted, limits):
+        if len(text) > limit:
+            text = text[:limit].rstrip() + "…"
+        out.append((url, text))
+    return out
 
 
-def llm_summarize(query: str, extracted: List[Tuple[str, str]], fallback_results: list) -> str:
+async def llm_summarize(client: httpx.AsyncClient, query: str, extracted: List[Tuple[str, str]], fallback_results: list) -> str:
     if extracted:
+        extracted = _fit_token_budget(extracted, SOURCES_MAX_TOKENS)
         sources = "\n\n---\n\n".join([f"URL: {u}\nTEXT: {t}" for (u, t) in extracted])
     else:
         # fallback to snippets if fetch blocked
@@ -500,12 +1016,65 @@ SOURCES:
 {sources}
 """.strip()
 
-    return _openai_chat(prompt, timeout=SUMMARIZE_TIMEOUT)
+    return await _openai_chat(client, prompt, timeout=SUMMARIZE_TIMEOUT)
+
+
+async def summarize_pipeline(client: httpx.AsyncClient, query: str, results: list) -> str:
+    """
+    Run select -> fetch -> summarize inside one event loop.
+
+    All three phases share the plugin's HTTP client so connections to the
+    LLM endpoint and to fetched hosts are reused, and no phase blocks on a
+    synchronous socket read. With LLM selection on, a selection made earlier
+    for the same query and hosts is reused; otherwise the locally ranked top
+    FETCH_K pages are fetched while the LLM decides; pages it also picks
+    are reused, the rest are cancelled, and only the difference is fetched.
+    """
+    candidates = _build_candidates(query, results)
+    local = local_select_urls(candidates)
+    fetch_one = _page_fetcher(client, query)
+
+    # 1) Select URLs: locally by snippet relevance, or via the LLM when enabled
+    prefetch: Dict[str, asyncio.Task] = {}
+    try:
+        selected = []
+        if LLM_SELECT:
+            key = _select_key(query, candidates)
+            cached = _SELECT_CACHE.get(key)
+            if cached is not None:
+                # same hosts may return different pages; keep URLs still in the results
+                urls = {c.url for c in candidates}
+                selected = [u for u in cached.split("\n") if u in urls]
+            if not selected:
+                prefetch = {u: asyncio.ensure_future(fetch_one(u)) for u in local[:FETCH_K]}
+                selected = await llm_select_urls(client, query, candidates)
+                if selected:
+                    _SELECT_CACHE.set(key, "\n".join(selected))
+        if not selected:
+            selected = local
+
+        urls_to_fetch = selected[:FETCH_K]
+
+        # 2) Fetch + extract, reusing speculative fetches the selection kept;
+        # the dropped ones are cancelled first to free their fetch slots
+        for u, task in prefetch.items():
+            if u not in urls_to_fetch:
+                task.cancel()
+        extracted = await fetch_pages(client, urls_to_fetch, query, fetch_one, prefetch)
+    finally:
+        # If this run was cancelled (e.g. timed out waiting for the LLM),
+        # speculative fetches must not keep running on the shared loop
+        for task in prefetch.values():
+            if not task.done():
+                task.cancel()
+
+    # 3) Summarize + suggested links
+    return await llm_summarize(client, query, extracted, results)
 
 
 class SXNGPlugin(Plugin):
     name = "ai_summarize_select_fetch"
-    description = "LLM selects best links from all snippets, fetches/extracts pages, then summarizes."
+    description = "Ranks all snippets to pick the best links, fetches/extracts pages, then summarizes with an LLM."
     default_on = False
 
     def post_search(self, request, search, result_container):
@@ -519,31 +1088,10 @@ class SXNGPlugin(Plugin):
 
         clean_q = _strip_trigger(q)
 
-        # 1) Select URLs using ALL snippets
-        selected = llm_select_urls(clean_q, result_container.results)
-        if not selected:
-            # fallback: use unique hostnames from top results
-            selected = []
-            seen_hosts = set()
-            for r in result_container.results:
-                u = getattr(r, "url", "") or ""
-                if not _is_http(u):
-                    continue
-                host = re.sub(r"^https?://", "", u).split("/")[0].lower()
-                if host in seen_hosts:
-                    continue
-                seen_hosts.add(host)
-                selected.append(u)
-                if len(selected) >= SELECT_K:
-                    break
-
-        urls_to_fetch = selected[:FETCH_K]
-
-        # 2) Fetch + extract
         try:
-            extracted = asyncio.run(fetch_pages(urls_to_fetch, clean_q))
-            # 3) Summarize + suggested links
-            ai_text = llm_summarize(clean_q, extracted, result_container.results)
+            ai_text = _run_in_loop(
+                summarize_pipeline, clean_q, result_container.results, timeout=PIPELINE_TIMEOUT
+            )
         except Exception:
             return
 
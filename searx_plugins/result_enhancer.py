@@ -11,29 +11,122 @@ This plugin improves result quality without requiring external API calls.
 """
 
 import re
-from urllib.parse import urlparse
+import string
+import unicodedata
 
 from searx.plugins import Plugin
 
 
+# URL patterns, compiled once: one C-level scan per URL instead of a
+# re.search() cache lookup per pattern
+_DOC_RE = re.compile(r'docs?\.|/documentation|/manual|/guide|readthedocs|/api|/reference')
+_NEWS_RE = re.compile(r'/news/|/article/|\.com/\d{4}/\d{2}/')  # incl. date-based URLs
+
+# Host-based categories: one named group each, so a single search both
+# matches and tells which category hit
+_REPO_HOSTS = r'github\.com|gitlab\.com|bitbucket\.org'
+_VIDEO_HOSTS = r'youtube\.com|vimeo\.com|youtu\.be'
+_ACADEMIC_HOSTS = r'arxiv\.org|scholar\.google|ieee\.org|acm\.org|springer\.com'
+_REPO_RE = re.compile(_REPO_HOSTS)
+_VIDEO_RE = re.compile(_VIDEO_HOSTS)
+_ACADEMIC_RE = re.compile(_ACADEMIC_HOSTS)
+_CATEGORY_RE = re.compile(
+    f'(?P<repo>{_REPO_HOSTS})|(?P<video>{_VIDEO_HOSTS})|(?P<academic>{_ACADEMIC_HOSTS})'
+)
+_CATEGORY_LABELS = {
+    'repo': "💻 Code Repository",
+    'video': "🎥 Video",
+    'academic': "🎓 Academic",
+}
+
+# Content-type checks in priority order; the first match labels the result.
+# A None label means it comes from the named group that matched.
+_CATEGORIES = (
+    (_DOC_RE, "📚 Documentation"),
+    (_CATEGORY_RE, None),
+    (_NEWS_RE, "📰 News"),
+)
+
+# Fingerprint normalization: drop ASCII punctuation, whitespace and the
+# combining accents NFKD splits off, in one str.translate() pass. "+" and
+# "#" are kept: they tell apart C / C++ / C#, F / F# and the like.
+_FP_KEEP = '+#'
+_FP_DELETE = str.maketrans('', '', ''.join(
+    c for c in string.punctuation if c not in _FP_KEEP
+) + string.whitespace + ''.join(
+    chr(c) for c in range(0x300, 0x370)
+))
+_FP_PREFIX = 128  # normalized chars hashed per result
+_FP_MIN = 32  # shorter texts are too generic to treat as duplicates
+_FP_MASK = (1 << 64) - 1
+
+# Reading time is estimated from this many leading characters at most
+# (~3000 words, well past the point where the estimate matters)
+_READING_SAMPLE_CHARS = 20000
+
+
+def _fingerprint(title: str, content: str):
+    """
+    Fingerprint a result by its normalized title and start of content.
+    
+    Results that differ only in case, punctuation, spacing or accents get
+    the same 64-bit value, catching copies whose URLs differ (tracking
+    parameters, mirrors) and whose titles aren't byte-identical.
+    
+    Returns:
+        64-bit int, or None if there is no snippet or the normalized text is
+        too short to be distinctive (a title alone is not enough evidence)
+    """
+    if not content.strip():
+        return None
+    norm = unicodedata.normalize('NFKD', f"{title} {content[:_FP_PREFIX * 2]}").lower().translate(_FP_DELETE)
+    if len(norm) < _FP_MIN:
+        return None
+    return hash(norm[:_FP_PREFIX]) & _FP_MASK
+
+
+def _fast_netloc(url: str) -> str:
+    """
+    Return the netloc of an absolute URL without a full urlparse().
+    
+    Slices between "://" and the first "/", "?" or "#" after it; URLs
+    without a scheme have no netloc, as with urlparse().
+    """
+    start = url.find("://")
+    if start < 0:
+        return ""
+    start += 3
+    end = len(url)
+    for sep in "/?#":
+        pos = url.find(sep, start)
+        if 0 <= pos < end:
+            end = pos
+    return url[start:end]
+
+
 class SXNGPlugin(Plugin):
     name = "result_enhancer"
     description = "Enhances search results with metadata and quality filtering."
     default_on = True
+    # No per-instance state
+    __slots__ = ()
 
     def post_search(self, request, search, result_container):
         """
         Process search results to enhance them with additional metadata.
         """
-        if not result_container.results:
+        results = result_container.results
+        if not results:
             return
         
         # Track seen URLs to detect duplicates
         seen_urls = set()
         seen_titles = set()
-        enhanced_results = []
+        seen_fingerprints = set()
+        # Kept results are compacted to the front of the list in place
+        kept = 0
         
-        for result in result_container.results:
+        for result in results:
             url = getattr(result, "url", "")
             title = getattr(result, "title", "")
             content = getattr(result, "content", "")
@@ -45,86 +138,78 @@ class SXNGPlugin(Plugin):
             if url in seen_urls:
                 continue
             
-            # Skip near-duplicate titles
+            # Skip near-duplicate titles; short ones ("Home", "Login") are
+            # too generic to dedupe on, so they are never tracked
             title_lower = title.lower().strip()
-            if title_lower in seen_titles and len(title_lower) > 10:
+            track_title = len(title_lower) > 10
+            if track_title and title_lower in seen_titles:
                 continue
             
+            # Skip near-duplicates whose title and snippet differ only cosmetically
+            fingerprint = _fingerprint(title, content or "")
+            if fingerprint is not None:
+                if fingerprint in seen_fingerprints:
+                    continue
+                seen_fingerprints.add(fingerprint)
+            
+            # Only kept results block later ones by URL or title
             seen_urls.add(url)
-            seen_titles.add(title_lower)
+            if track_title:
+                seen_titles.add(title_lower)
+            url_lower = url.lower()
             
             # Enhance content with metadata
             enhancements = []
             
             # Add domain indicator
-            domain = urlparse(url).netloc
+            domain = _fast_netloc(url)
             if domain:
-                domain_clean = domain.replace("www.", "")
+                domain_clean = domain[4:] if domain.startswith("www.") else domain
                 enhancements.append(f"🌐 {domain_clean}")
             
             # Detect content type from URL and content
-            if self._is_documentation(url, content):
-                enhancements.append("📚 Documentation")
-            elif self._is_code_repository(url):
-                enhancements.append("💻 Code Repository")
-            elif self._is_video(url):
-                enhancements.append("🎥 Video")
-            elif self._is_academic(url, content):
-                enhancements.append("🎓 Academic")
-            elif self._is_news(url):
-                enhancements.append("📰 News")
+            for pattern, label in _CATEGORIES:
+                match = pattern.search(url_lower)
+                if match:
+                    enhancements.append(label or _CATEGORY_LABELS[match.lastgroup])
+                    break
             
             # Estimate reading time
             if content:
-                words = len(content.split())
+                words = len(content[:_READING_SAMPLE_CHARS].split())
                 if words > 50:
                     reading_time = max(1, words // 200)  # ~200 words per minute
                     enhancements.append(f"⏱️ {reading_time} min read")
             
             # Add enhancements to content
             if enhancements:
-                enhancement_text = " | ".join(enhancements)
-                if hasattr(result, 'content') and result.content:
-                    result.content = f"[{enhancement_text}]\n{result.content}"
-                else:
-                    result.content = f"[{enhancement_text}]"
+                prefix = "[" + " | ".join(enhancements) + "]"
+                result.content = f"{prefix}\n{content}" if content else prefix
             
-            enhanced_results.append(result)
+            results[kept] = result
+            kept += 1
         
-        # Replace results with enhanced version
-        result_container.results = enhanced_results
+        # Drop the tail left over by skipped results
+        del results[kept:]
     
+    # Standalone checks for single URLs; post_search classifies with the
+    # module-level _CATEGORIES table instead, lowercasing each URL once
     def _is_documentation(self, url: str, content: str) -> bool:
         """Check if result is documentation."""
-        doc_patterns = [
-            r'docs?\.',
-            r'/documentation',
-            r'/manual',
-            r'/guide',
-            r'readthedocs',
-            r'/api',
-            r'/reference',
-        ]
-        return any(re.search(pattern, url.lower()) for pattern in doc_patterns)
+        return bool(_DOC_RE.search(url.lower()))
     
     def _is_code_repository(self, url: str) -> bool:
         """Check if result is a code repository."""
-        return any(domain in url.lower() for domain in ['github.com', 'gitlab.com', 'bitbucket.org'])
+        return bool(_REPO_RE.search(url.lower()))
     
     def _is_video(self, url: str) -> bool:
         """Check if result is a video."""
-        return any(domain in url.lower() for domain in ['youtube.com', 'vimeo.com', 'youtu.be'])
+        return bool(_VIDEO_RE.search(url.lower()))
     
     def _is_academic(self, url: str, content: str) -> bool:
         """Check if result is academic content."""
-        academic_domains = ['arxiv.org', 'scholar.google', 'ieee.org', 'acm.org', 'springer.com']
-        return any(domain in url.lower() for domain in academic_domains)
+        return bool(_ACADEMIC_RE.search(url.lower()))
     
     def _is_news(self, url: str) -> bool:
         """Check if result is from a news site."""
-        news_patterns = [
-            r'/news/',
-            r'/article/',
-            r'\.com/\d{4}/\d{2}/',  # Date-based URLs
-        ]
-        return any(re.search(pattern, url.lower()) for pattern in news_patterns)
+        return bool(_NEWS_RE.search(url.lower()))
@@ -11,16 +11,35 @@ This plugin helps users find better search terms without external API calls.
 """
 
 import re
+import time
 from collections import Counter
+from datetime import datetime
 
 from searx.plugins import Plugin
 from searx.result_types import Suggestion
 
 
+# (monotonic time checked, year); refreshed at most hourly instead of per search
+_YEAR_REFRESH = 3600
+_year_cache = (0.0, 0)
+
+
+def _current_year() -> int:
+    global _year_cache
+    checked_at, year = _year_cache
+    now = time.monotonic()
+    if not year or now - checked_at >= _YEAR_REFRESH:
+        year = datetime.now().year
+        _year_cache = (now, year)
+    return year
+
+
 class SXNGPlugin(Plugin):
     name = "smart_suggestions"
     description = "Provides intelligent search suggestions and refinements."
     default_on = True
+    # No per-instance state
+    __slots__ = ()
 
     # Common query refinements
     REFINEMENTS = {
@@ -29,17 +48,28 @@ class SXNGPlugin(Plugin):
         'best': ['top', 'recommended', 'comparison', 'review'],
         'vs': ['comparison', 'difference between', 'which is better'],
     }
+    # All refinement triggers, longest first, found in one scan of the query
+    _REFINE_RE = re.compile('|'.join(map(re.escape, sorted(REFINEMENTS, key=len, reverse=True))))
     
     # Technical query enhancers
-    TECH_KEYWORDS = {
+    TECH_KEYWORDS = frozenset({
         'python', 'javascript', 'java', 'rust', 'golang', 'typescript',
         'react', 'vue', 'angular', 'node', 'django', 'flask',
         'docker', 'kubernetes', 'aws', 'azure', 'gcp',
-    }
+    })
+    # Any tech keyword as a whole word; suggestions mentioning one keep their casing
+    _TECH_RE = re.compile(r'\b(?:' + '|'.join(map(re.escape, sorted(TECH_KEYWORDS))) + r')\b')
+    
+    # Meaningful title words: 4+ word characters
+    _TITLE_TERM_RE = re.compile(r'\b\w{4,}\b')
+    
+    # Words that make a query time-sensitive (substring match, as before)
+    _TIME_RE = re.compile(r'latest|current|new|recent|modern|updated')
     
     def post_search(self, request, search, result_container):
         """Generate smart suggestions based on the query and results."""
-        q = (search.search_query.query or "").strip().lower()
+        search_query = getattr(search, "search_query", None)
+        q = (getattr(search_query, "query", "") or "").strip().lower()
         
         if not q or len(q) < 3:
             return
@@ -47,8 +77,9 @@ class SXNGPlugin(Plugin):
         suggestions = []
         
         # Generate refinement suggestions
+        matched = {m.group() for m in self._REFINE_RE.finditer(q)}
         for pattern, refinements in self.REFINEMENTS.items():
-            if pattern in q:
+            if pattern in matched:
                 base_query = q.replace(pattern, '').strip()
                 for refinement in refinements:
                     if refinement not in q:
@@ -60,37 +91,35 @@ class SXNGPlugin(Plugin):
         tech_words = query_words & self.TECH_KEYWORDS
         
         if tech_words:
-            for tech in tech_words:
-                # Add common technical suffixes
-                if 'tutorial' not in q and 'guide' not in q:
-                    suggestions.append(f"{q} tutorial")
-                if 'documentation' not in q and 'docs' not in q:
-                    suggestions.append(f"{q} documentation")
-                if 'example' not in q and 'examples' not in q:
-                    suggestions.append(f"{q} examples")
+            # Add common technical suffixes (once, however many tech words matched)
+            if 'tutorial' not in q and 'guide' not in q:
+                suggestions.append(f"{q} tutorial")
+            if 'documentation' not in q and 'docs' not in q:
+                suggestions.append(f"{q} documentation")
+            if 'example' not in q and 'examples' not in q:
+                suggestions.append(f"{q} examples")
         
         # Extract common terms from result titles
         if result_container.results:
-            title_words = []
+            term_counts = Counter()
             for result in result_container.results[:10]:
                 title = getattr(result, "title", "")
                 if title:
-                    # Extract meaningful words (length > 3, not in original query)
-                    words = re.findall(r'\b\w{4,}\b', title.lower())
-                    title_words.extend([w for w in words if w not in query_words])
+                    # Count meaningful words (length > 3, not in original query)
+                    term_counts.update(
+                        w for w in self._TITLE_TERM_RE.findall(title.lower()) if w not in query_words
+                    )
             
             # Find most common terms not in original query
-            if title_words:
-                common_terms = Counter(title_words).most_common(5)
+            if term_counts:
+                common_terms = term_counts.most_common(5)
                 for term, count in common_terms:
                     if count >= 2 and term not in q:
                         suggestions.append(f"{q} {term}")
         
         # Add year for time-sensitive queries
-        time_keywords = ['latest', 'current', 'new', 'recent', 'modern', 'updated']
-        if any(keyword in q for keyword in time_keywords):
-            from datetime import datetime
-            current_year = datetime.now().year
+        if self._TIME_RE.search(q):
+            current_year = _current_year()
             if str(current_year) not in q:
                 suggestions.append(f"{q} {current_year}")
         
@@ -99,17 +128,16 @@ class SXNGPlugin(Plugin):
             if 'alternative' not in q:
                 suggestions.append(f"{q} alternatives")
         
-        # Limit to top 5 unique suggestions
-        unique_suggestions = []
-        seen = set()
+        # Limit to top 5 unique suggestions, keyed by normalized text (dicts keep order)
+        unique_suggestions = {}
         for s in suggestions:
             s_normalized = s.strip().lower()
-            if s_normalized not in seen and s_normalized != q:
-                unique_suggestions.append(s.title() if not any(tech in s for tech in self.TECH_KEYWORDS) else s)
-                seen.add(s_normalized)
-                if len(unique_suggestions) >= 5:
-                    break
+            if s_normalized == q or s_normalized in unique_suggestions:
+                continue
+            unique_suggestions[s_normalized] = s if self._TECH_RE.search(s) else s.title()
+            if len(unique_suggestions) >= 5:
+                break
         
         # Add suggestions to result container
-        for suggestion_text in unique_suggestions:
+        for suggestion_text in unique_suggestions.values():
             result_container.suggestions.add(suggestion_text)
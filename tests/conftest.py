@@ -0,0 +1,62 @@
+"""
+Shared test setup: stub out SearXNG and make the plugins importable.
+
+The plugins import from searx at module level, so the stubs have to be
+in sys.modules before pytest imports any test module. conftest.py is
+imported first, once per session (and once per xdist worker).
+"""
+
+import os
+import sys
+import types
+from unittest.mock import Mock
+
+import pytest
+
+
+class MockPlugin:
+    """Stand-in for searx.plugins.Plugin, so plugins subclass a real class."""
+
+    def __init__(self):
+        pass
+
+
+def _install_searx_stubs():
+    """
+    Register plain module objects for the searx names the plugins import.
+
+    ModuleType stubs only carry the attributes set here, unlike MagicMock
+    trees that build child mocks on every new attribute access.
+    """
+    searx = types.ModuleType("searx")
+    searx.plugins = types.ModuleType("searx.plugins")
+    searx.plugins.Plugin = MockPlugin
+    searx.result_types = types.ModuleType("searx.result_types")
+    searx.result_types.Answer = Mock
+    searx.result_types.Suggestion = Mock
+    sys.modules.update({
+        "searx": searx,
+        "searx.plugins": searx.plugins,
+        "searx.result_types": searx.result_types,
+    })
+
+
+_install_searx_stubs()
+
+_PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "searx_plugins")
+if _PLUGIN_DIR not in sys.path:
+    sys.path.insert(0, _PLUGIN_DIR)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_extraction():
+    """
+    Run one extraction before any test.
+
+    The first trafilatura/lxml call does one-off setup (~150ms). Warming up
+    here keeps that cost out of whichever test happens to run first, and
+    under xdist each worker pays it once.
+    """
+    from ai_summarize_select_fetch import _extract_enhanced
+
+    _extract_enhanced("<html><body><p>warm</p></body></html>", "http://example.com", "warm")
@@ -6,28 +6,9 @@ Tests for additional SearXNG plugins:
 """
 
 import unittest
-from unittest.mock import Mock, patch, MagicMock
-import sys
-import os
+from unittest.mock import Mock, patch
 
-# Mock the searx modules before importing plugins
-sys.modules['searx'] = MagicMock()
-sys.modules['searx.plugins'] = MagicMock()
-sys.modules['searx.result_types'] = MagicMock()
-
-# Create a real Plugin base class for testing
-class MockPlugin:
-    def __init__(self):
-        pass
-
-sys.modules['searx'].plugins.Plugin = MockPlugin
-sys.modules['searx'].result_types.Answer = Mock
-sys.modules['searx'].result_types.Suggestion = Mock
-
-# Add the plugin directory to the path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'searx_plugins'))
-
-# Now import the actual plugins
+# searx stubs and the plugin path are set up in conftest.py
 import result_enhancer
 import smart_suggestions
 import ai_quick_answer
@@ -64,6 +45,27 @@ class TestResultEnhancer(unittest.TestCase):
         self.assertTrue(self.plugin._is_academic("https://scholar.google.com/", ""))
         self.assertFalse(self.plugin._is_academic("https://example.com", ""))
     
+    def test_detects_news(self):
+        """Test news detection, including date-based URLs."""
+        self.assertTrue(self.plugin._is_news("https://example.com/news/story"))
+        self.assertTrue(self.plugin._is_news("https://paper.com/2024/05/headline"))
+        self.assertFalse(self.plugin._is_news("https://example.com/about"))
+    
+    def test_detection_ignores_url_case(self):
+        """Test that the content-type checks match mixed-case URLs."""
+        self.assertTrue(self.plugin._is_documentation("https://Docs.Python.org/3/", ""))
+        self.assertTrue(self.plugin._is_code_repository("https://GitHub.com/user/repo"))
+        self.assertTrue(self.plugin._is_video("https://www.YouTube.com/watch?v=123"))
+        self.assertTrue(self.plugin._is_academic("https://ArXiv.org/abs/1234", ""))
+        self.assertTrue(self.plugin._is_news("https://example.com/News/story"))
+    
+    def test_fast_netloc(self):
+        """Test netloc slicing matches urlparse for common URL shapes."""
+        self.assertEqual(result_enhancer._fast_netloc("https://www.a.com/x?y#z"), "www.a.com")
+        self.assertEqual(result_enhancer._fast_netloc("https://a.com?x=/y"), "a.com")
+        self.assertEqual(result_enhancer._fast_netloc("http://user@host:8080#top"), "user@host:8080")
+        self.assertEqual(result_enhancer._fast_netloc("no-scheme.com/path"), "")
+    
     def test_enhances_results(self):
         """Test that results are enhanced with metadata."""
         # Create mock result container
@@ -88,6 +90,28 @@ class TestResultEnhancer(unittest.TestCase):
         self.assertIn("docs.python.org", result1.content)
         self.assertIn("min read", result1.content)
     
+    def test_labels_host_categories(self):
+        """Test that repository, video and academic URLs get their label."""
+        result_container = Mock()
+        urls = {
+            "https://github.com/user/repo": "💻 Code Repository",
+            "https://youtu.be/abc": "🎥 Video",
+            "https://arxiv.org/abs/1234": "🎓 Academic",
+        }
+        results = []
+        for i, url in enumerate(urls):
+            result = Mock()
+            result.url = url
+            result.title = f"Result number {i}"
+            result.content = "Short"
+            results.append(result)
+        result_container.results = results
+        
+        self.plugin.post_search(Mock(), Mock(), result_container)
+        
+        for result, label in zip(results, urls.values()):
+            self.assertIn(label, result.content)
+    
     def test_removes_duplicates(self):
         """Test that duplicate results are filtered."""
         result_container = Mock()
@@ -113,6 +137,89 @@ class TestResultEnhancer(unittest.TestCase):
         
         # Should only have 1 result after deduplication
         self.assertEqual(len(result_container.results), 1)
+    
+    def test_dedupes_in_place_keeping_order(self):
+        """Test that duplicates are removed from the same list, in order."""
+        results = []
+        for url, title in [("https://a.com/", "First result"), ("https://a.com/", "Copy"),
+                           ("https://b.com/", "Second result"), ("", "No URL"),
+                           ("https://c.com/", "Third result")]:
+            result = Mock()
+            result.url = url
+            result.title = title
+            result.content = ""
+            results.append(result)
+        expected = [results[0], results[2], results[4]]
+        
+        result_container = Mock()
+        result_container.results = results
+        self.plugin.post_search(Mock(), Mock(), result_container)
+        
+        self.assertIs(result_container.results, results)
+        self.assertEqual(results, expected)
+    
+    def test_removes_near_duplicates(self):
+        """Test that copies differing only in URL params, case and punctuation are removed."""
+        result1 = Mock()
+        result1.url = "https://example.com/story?utm_source=a"
+        result1.title = "Café opens downtown"
+        result1.content = "The new café opened its doors on Monday, drawing a large crowd."
+        
+        result2 = Mock()
+        result2.url = "https://example.com/story?utm_source=b"
+        result2.title = "CAFE OPENS DOWNTOWN!"
+        result2.content = "The new cafe opened its doors on Monday drawing a large crowd"
+        
+        result3 = Mock()
+        result3.url = "https://other.com/"
+        result3.title = "Home"
+        result3.content = ""
+        
+        result4 = Mock()
+        result4.url = "https://another.com/"
+        result4.title = "Home"
+        result4.content = ""
+        
+        result_container = Mock()
+        result_container.results = [result1, result2, result3, result4]
+        self.plugin.post_search(Mock(), Mock(), result_container)
+        
+        self.assertEqual(result_container.results, [result1, result3, result4])
+    
+    def test_near_duplicate_check_keeps_distinct_results(self):
+        """Test that titles differing in meaningful symbols, or without snippets, are kept."""
+        def result(url, title, content):
+            r = Mock()
+            r.url, r.title, r.content = url, title, content
+            return r
+        
+        c = result("https://a.com/c", "C Programming Language Tutorial for Beginners", "")
+        csharp = result("https://b.com/cs", "C# Programming Language Tutorial for Beginners", "")
+        cpp = result("https://c.com/cpp", "C++ Programming Language Tutorial", "Learn the language from scratch with examples.")
+        c2 = result("https://d.com/c", "C Programming Language Tutorial", "Learn the language from scratch with examples.")
+        
+        result_container = Mock()
+        result_container.results = [c, csharp, cpp, c2]
+        self.plugin.post_search(Mock(), Mock(), result_container)
+        
+        self.assertEqual(result_container.results, [c, csharp, cpp, c2])
+    
+    def test_dropped_near_duplicate_does_not_claim_its_title(self):
+        """Test that a result dropped as a near-duplicate doesn't block a later one by title."""
+        def result(url, title, content):
+            r = Mock()
+            r.url, r.title, r.content = url, title, content
+            return r
+        
+        original = result("https://a.com/", "Original story title", "The same snippet text appears in both of these results.")
+        copy = result("https://b.com/", "Original Story, Title", "The same snippet text appears in both of these results!")
+        other = result("https://c.com/", "Original Story, Title", "A different snippet that is not a copy of anything above.")
+        
+        result_container = Mock()
+        result_container.results = [original, copy, other]
+        self.plugin.post_search(Mock(), Mock(), result_container)
+        
+        self.assertEqual(result_container.results, [original, other])
 
 
 class TestSmartSuggestions(unittest.TestCase):
@@ -195,6 +302,37 @@ class TestSmartSuggestions(unittest.TestCase):
         # Should not have too many suggestions
         self.assertLessEqual(len(result_container.suggestions), 6)
     
+    def test_keeps_casing_only_for_tech_suggestions(self):
+        """Test that suggestions naming a tech keyword are not title-cased."""
+        result_container = Mock()
+        result_container.results = []
+        result_container.suggestions = set()
+        
+        search = Mock()
+        search.search_query.query = "how to learn python"
+        self.plugin.post_search(Mock(), search, result_container)
+        self.assertIn("tutorial learn python", result_container.suggestions)
+        
+        # "laws" contains "aws" but is not a tech keyword
+        result_container.suggestions = set()
+        search.search_query.query = "what is tax laws"
+        self.plugin.post_search(Mock(), search, result_container)
+        self.assertIn("Definition Tax Laws", result_container.suggestions)
+    
+    def test_suggests_current_year_for_time_sensitive_queries(self):
+        """Test that 'latest' queries get the current year appended."""
+        from datetime import datetime
+        
+        result_container = Mock()
+        result_container.results = []
+        result_container.suggestions = set()
+        
+        search = Mock()
+        search.search_query.query = "latest phone"
+        self.plugin.post_search(Mock(), search, result_container)
+        
+        self.assertIn(f"Latest Phone {datetime.now().year}", result_container.suggestions)
+    
     def test_ignores_short_queries(self):
         """Test that very short queries don't generate suggestions."""
         result_container = Mock()
@@ -246,6 +384,7 @@ class TestAIQuickAnswer(unittest.TestCase):
         
         result_container = Mock()
         result_container.answers = []
+        result_container.results = []
         
         request = Mock()
         search = Mock()
@@ -256,6 +395,61 @@ class TestAIQuickAnswer(unittest.TestCase):
         # Should have called the answer generator
         mock_get_answer.assert_called_once()
     
+    @patch.object(ai_quick_answer, 'OPENAI_API_KEY', 'test-key')
+    @patch.object(ai_quick_answer, '_get_quick_answer')
+    def test_skips_llm_when_answer_exists(self, mock_get_answer):
+        """Test that an existing engine answer short-circuits the LLM."""
+        result_container = Mock()
+        result_container.answers = [Mock()]
+        result_container.results = []
+        
+        search = Mock()
+        search.search_query.query = "what is python !!ask"
+        
+        self.plugin.post_search(Mock(), search, result_container)
+        
+        mock_get_answer.assert_not_called()
+        self.assertEqual(len(result_container.answers), 1)
+    
+    @patch.object(ai_quick_answer, 'OPENAI_API_KEY', 'test-key')
+    @patch.object(ai_quick_answer, '_get_quick_answer')
+    def test_uses_definitional_snippet(self, mock_get_answer):
+        """Test that a complete top snippet answers a definitional query."""
+        snippet = ("Python is a high-level, general-purpose programming language. "
+                   "Its design philosophy emphasizes code readability with the use of "
+                   "significant indentation. Python is dynamically typed and garbage-collected.")
+        result = Mock()
+        result.url = "https://en.wikipedia.org/wiki/Python_(programming_language)"
+        result.content = snippet
+        
+        result_container = Mock()
+        result_container.answers = []
+        result_container.results = [result]
+        
+        search = Mock()
+        search.search_query.query = "what is python !!ask"
+        
+        with patch.object(ai_quick_answer, 'Answer') as answer:
+            self.plugin.post_search(Mock(), search, result_container)
+        
+        mock_get_answer.assert_not_called()
+        self.assertEqual(len(result_container.answers), 1)
+        kwargs = answer.call_args.kwargs
+        self.assertNotIn("AI", kwargs["title"])
+        self.assertEqual(kwargs["content"], f"{snippet}\n\nSource: {result.url}")
+    
+    def test_snippet_answer_rejects_short_or_truncated(self):
+        """Test that short, truncated or non-definitional snippets are ignored."""
+        complete = Mock(content="Python is a language. " * 12)
+        truncated = Mock(content="Python is a language. " * 12 + "It is...")
+        short = Mock(content="Python is a language.")
+        
+        self.assertEqual(ai_quick_answer._snippet_answer("what is python", [complete]),
+                         (complete.content.strip(), complete.url))
+        self.assertIsNone(ai_quick_answer._snippet_answer("what is python", [Mock(url="", content=complete.content)]))
+        self.assertIsNone(ai_quick_answer._snippet_answer("what is python", [truncated, short]))
+        self.assertIsNone(ai_quick_answer._snippet_answer("python release date", [complete]))
+    
     def test_no_answer_without_api_key(self):
         """Test that no answer is generated without API key."""
         # Save original key
@@ -9,27 +9,295 @@ Tests focus on content extraction enhancement features:
 """
 
 import unittest
-from unittest.mock import Mock, patch, MagicMock
-import sys
-import os
+from unittest.mock import Mock, patch
+import asyncio
+import json
+import threading
+import concurrent.futures
+from functools import lru_cache
 
-# Mock the searx modules before importing the plugin
-sys.modules['searx'] = MagicMock()
-sys.modules['searx.plugins'] = MagicMock()
-sys.modules['searx.result_types'] = MagicMock()
-
-# Add the plugin directory to the path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'searx_plugins'))
+import pytest
 
+# searx stubs and the plugin path are set up in conftest.py
 from ai_summarize_select_fetch import (
     ContentAnalyzer,
+    _parse_content_blocks,
     _calculate_content_density,
+    _alnum_space_count,
     _calculate_relevance_score,
+    _query_terms,
     _extract_enhanced,
+    _regex_content_blocks,
     _clean,
     _is_http,
     _strip_trigger,
+    local_select_urls,
+    _build_candidates,
+    _openai_chat,
+    llm_select_urls,
+    _TTLCache,
+    fetch_and_extract,
+    fetch_pages,
+    _dedupe_by_content,
+    _fit_token_budget,
+    summarize_pipeline,
 )
+import ai_summarize_select_fetch
+
+import httpx
+
+
+# -------------------------
+# HTML fixtures
+# -------------------------
+
+HTML_NAV_ARTICLE = """
+<html>
+    <nav>
+        <a href="#">Home</a>
+        <a href="#">About</a>
+    </nav>
+    <article>
+        <p>This is the main content of the article that should be extracted.</p>
+    </article>
+</html>
+"""
+
+HTML_SIDEBAR_ID = """
+<div id="Sidebar-Left"><p>Related links that should not be part of the extracted text.</p></div>
+<div class><p>This is the main content of the article that should be extracted.</p></div>
+"""
+
+HTML_FOOTER = """
+<html>
+    <article>
+        <p>Main article content here with substantial information.</p>
+    </article>
+    <footer>
+        <p>Copyright 2024. All rights reserved.</p>
+    </footer>
+</html>
+"""
+
+HTML_ADS = """
+<html>
+    <div class="content">
+        <p>Real content that provides value to users and answers their questions.</p>
+    </div>
+    <div class="ad-banner">
+        <p>Buy this product now!</p>
+    </div>
+    <div class="advertisement">
+        <p>Special offer today only!</p>
+    </div>
+</html>
+"""
+
+HTML_SOCIAL = """
+<html>
+    <article>
+        <p>This is valuable article content with detailed information and analysis.</p>
+    </article>
+    <div class="social-share">
+        <button>Share on Facebook</button>
+        <button>Share on Twitter</button>
+    </div>
+</html>
+"""
+
+HTML_SHORT_BLOCK = """
+<html>
+    <p>Short.</p>
+    <p>This is a much longer paragraph with substantial content that should be included in extraction.</p>
+</html>
+"""
+
+HTML_MIXED = """
+<html>
+    <nav><a href="#">Home</a></nav>
+    <div class="content">
+        <p>Real content that provides value to users and answers their questions.</p>
+        <div class="ad-banner"><p>Buy this product now!</p></div>
+        <p>Another paragraph with enough text to pass the minimum block length &amp; more.</p>
+    </div>
+    <footer><p>Copyright 2024. All rights reserved.</p></footer>
+</html>
+"""
+
+HTML_ENTITIES = """
+<html><body><article>
+    <p>Don&rsquo;t leave without trying the caf&eacute; in S&atilde;o Paulo, it&#39;s open all night.</p>
+</article></body></html>
+"""
+
+HTML_VOID_INPUT = """
+<html>
+    <input type="checkbox">
+    <article>
+        <p>This is the main content of the article that should be extracted.</p>
+    </article>
+</html>
+"""
+
+HTML_ARTICLE = """
+<html>
+    <head><title>Test Article</title></head>
+    <body>
+        <nav><a href="#">Menu</a></nav>
+        <article>
+            <h1>Article Title</h1>
+            <p>This is the main content of the article with important information.</p>
+            <p>It has multiple paragraphs with detailed explanations and analysis.</p>
+        </article>
+        <footer>Copyright notice</footer>
+    </body>
+</html>
+"""
+
+HTML_RELEVANCE = """
+<html>
+    <body>
+        <article>
+            <section>
+                <p>Irrelevant content about something completely different that has nothing to do with the query.</p>
+                <p>More filler text that is not relevant at all to what the user is searching for.</p>
+            </section>
+            <section>
+                <p>Python programming is a powerful skill. Python is used for web development, data science, and automation.</p>
+                <p>Learning Python can open many career opportunities in software development.</p>
+            </section>
+        </article>
+    </body>
+</html>
+"""
+
+HTML_JS_HEAVY = """
+<html>
+    <body>
+        <script>
+            function doSomething() {
+                var x = 1;
+                console.log(x);
+            }
+        </script>
+        <article>
+            <p>This is the actual content that should be extracted from the page.</p>
+        </article>
+        <script>moreJavaScript();</script>
+    </body>
+</html>
+"""
+
+HTML_BLOG = """
+<html>
+    <body>
+        <header>
+            <nav>Home | About | Contact</nav>
+        </header>
+        <main>
+            <article>
+                <h1>Blog Post Title</h1>
+                <p>This is the introduction paragraph of the blog post with interesting content.</p>
+                <p>The body of the blog post continues with more detailed information and analysis.</p>
+            </article>
+            <aside class="sidebar">
+                <div class="widget">Recent Posts</div>
+                <div class="ad-widget">Advertisement</div>
+            </aside>
+        </main>
+        <footer>Blog footer</footer>
+    </body>
+</html>
+"""
+
+HTML_NEWS = """
+<html>
+    <body>
+        <article class="news-article">
+            <h1>Breaking News Headline</h1>
+            <div class="byline">By Reporter Name</div>
+            <p>The first paragraph of the news article contains the most important information.</p>
+            <p>Subsequent paragraphs provide additional context and details about the event.</p>
+            <p>Expert quotes and analysis are included in later paragraphs.</p>
+        </article>
+        <div class="related-articles">
+            <h3>Related Stories</h3>
+            <a href="#">Other news</a>
+        </div>
+    </body>
+</html>
+"""
+
+HTML_ECOMMERCE = """
+<html>
+    <body>
+        <nav>Categories | Cart | Account</nav>
+        <main>
+            <div class="product">
+                <h1>Product Name</h1>
+                <p class="description">This product is perfect for users who need high-quality solutions.</p>
+                <div class="specs">
+                    <p>Specifications: Premium quality, durable construction, easy to use.</p>
+                </div>
+            </div>
+            <div class="reviews">
+                <h2>Customer Reviews</h2>
+                <p>Great product! Works as advertised and exceeds expectations.</p>
+            </div>
+        </main>
+        <div class="recommendations">You might also like...</div>
+    </body>
+</html>
+"""
+
+HTML_WIKI = """
+<html>
+    <body>
+        <div id="content">
+            <h1>Article Subject</h1>
+            <p>The article subject is an important topic in computer science and technology.</p>
+            <section>
+                <h2>History</h2>
+                <p>The history section provides background information and context about the development.</p>
+            </section>
+            <section>
+                <h2>Technical Details</h2>
+                <p>Technical details explain how the system works and its key components.</p>
+            </section>
+        </div>
+        <div id="footer">
+            <p>This page was last edited on...</p>
+        </div>
+    </body>
+</html>
+"""
+
+LONG_PARAGRAPH_HTML = "".join((
+    "<html><body><article><p>",
+    "This is a long paragraph. " * 1000,
+    "</p></article></body></html>",
+))
+
+
+# Fixtures are never mutated, so parse/extract results can be shared across tests
+
+@lru_cache(maxsize=64)
+def _parse(html):
+    """
+    Parse `html` the way extraction does: ContentAnalyzer driven by lxml.
+    
+    Returns:
+        (blocks, combined): the content blocks as a tuple, and them joined
+        with spaces for substring assertions
+    """
+    blocks = tuple(_parse_content_blocks(html))
+    return blocks, ' '.join(blocks)
+
+
+@lru_cache(maxsize=64)
+def _extract_cached(html, url, query):
+    """`_extract_enhanced` memoized; only for tests that don't patch module config."""
+    return _extract_enhanced(html, url, query)
 
 
 class TestContentAnalyzer(unittest.TestCase):
@@ -37,181 +305,150 @@ class TestContentAnalyzer(unittest.TestCase):
     
     def test_excludes_navigation(self):
         """Test that navigation elements are excluded."""
-        html = """
-        <html>
-            <nav>
-                <a href="#">Home</a>
-                <a href="#">About</a>
-            </nav>
-            <article>
-                <p>This is the main content of the article that should be extracted.</p>
-            </article>
-        </html>
-        """
-        analyzer = ContentAnalyzer()
-        analyzer.feed(html)
-        
         # Should not include nav content
-        combined = ' '.join(analyzer.content_blocks)
+        _, combined = _parse(HTML_NAV_ARTICLE)
         self.assertNotIn('Home', combined)
         self.assertNotIn('About', combined)
         self.assertIn('main content', combined)
     
+    def test_excludes_by_id_and_tolerates_valueless_class(self):
+        """Test id-based exclusion and that a bare class attribute doesn't crash."""
+        _, combined = _parse(HTML_SIDEBAR_ID)
+        self.assertNotIn('Related links', combined)
+        self.assertIn('main content', combined)
+    
     def test_excludes_footer(self):
         """Test that footer elements are excluded."""
-        html = """
-        <html>
-            <article>
-                <p>Main article content here with substantial information.</p>
-            </article>
-            <footer>
-                <p>Copyright 2024. All rights reserved.</p>
-            </footer>
-        </html>
-        """
-        analyzer = ContentAnalyzer()
-        analyzer.feed(html)
-        
-        combined = ' '.join(analyzer.content_blocks)
+        _, combined = _parse(HTML_FOOTER)
         self.assertIn('Main article content', combined)
         self.assertNotIn('Copyright', combined)
     
     def test_excludes_ads_by_class(self):
         """Test that ad elements are excluded by class pattern."""
-        html = """
-        <html>
-            <div class="content">
-                <p>Real content that provides value to users and answers their questions.</p>
-            </div>
-            <div class="ad-banner">
-                <p>Buy this product now!</p>
-            </div>
-            <div class="advertisement">
-                <p>Special offer today only!</p>
-            </div>
-        </html>
-        """
-        analyzer = ContentAnalyzer()
-        analyzer.feed(html)
-        
-        combined = ' '.join(analyzer.content_blocks)
+        _, combined = _parse(HTML_ADS)
         self.assertIn('Real content', combined)
         self.assertNotIn('Buy this product', combined)
         self.assertNotIn('Special offer', combined)
     
     def test_excludes_social_widgets(self):
         """Test that social sharing widgets are excluded."""
-        html = """
-        <html>
-            <article>
-                <p>This is valuable article content with detailed information and analysis.</p>
-            </article>
-            <div class="social-share">
-                <button>Share on Facebook</button>
-                <button>Share on Twitter</button>
-            </div>
-        </html>
-        """
-        analyzer = ContentAnalyzer()
-        analyzer.feed(html)
-        
-        combined = ' '.join(analyzer.content_blocks)
+        _, combined = _parse(HTML_SOCIAL)
         self.assertIn('valuable article content', combined)
         self.assertNotIn('Share on', combined)
     
     def test_minimum_block_length(self):
         """Test that short blocks are filtered out."""
-        html = """
-        <html>
-            <p>Short.</p>
-            <p>This is a much longer paragraph with substantial content that should be included in extraction.</p>
-        </html>
-        """
-        analyzer = ContentAnalyzer()
-        analyzer.feed(html)
+        blocks, combined = _parse(HTML_SHORT_BLOCK)
         
         # Short block should be excluded (< 50 chars)
-        self.assertTrue(len(analyzer.content_blocks) >= 1)
-        combined = ' '.join(analyzer.content_blocks)
+        self.assertTrue(len(blocks) >= 1)
         self.assertIn('substantial content', combined)
+    
+    def test_lxml_parser_matches_html_parser(self):
+        """Test that the lxml-driven parse yields the same blocks as html.parser."""
+        for html in (HTML_NAV_ARTICLE, HTML_SIDEBAR_ID, HTML_FOOTER, HTML_ADS, HTML_SOCIAL,
+                     HTML_SHORT_BLOCK, HTML_MIXED, HTML_ENTITIES):
+            with self.subTest(html=html):
+                analyzer = ContentAnalyzer()
+                analyzer.feed(html)
+                self.assertEqual(_parse(html)[0], tuple(analyzer.content_blocks))
+    
+    def test_entities_do_not_split_words(self):
+        """Test that lxml's per-entity text events are joined without spaces."""
+        self.assertEqual(
+            _parse_content_blocks(HTML_ENTITIES),
+            ["Don\u2019t leave without trying the caf\u00e9 in S\u00e3o Paulo, it's open all night."],
+        )
+    
+    def test_void_excluded_tag_does_not_hide_page(self):
+        """Test that an unclosed <input> only excludes itself with the lxml parser."""
+        combined = ' '.join(_parse_content_blocks(HTML_VOID_INPUT))
+        self.assertIn('main content', combined)
+
+
+# Pure scoring helpers: one parametrized test per behaviour
+
+_QUALITY_TEXT = """
+This is a well-written article with multiple sentences. It contains
+valuable information that users are looking for. The content is
+structured properly with good grammar and punctuation. This type
+of content should score highly on density metrics.
+"""
+
+
+@pytest.mark.parametrize("text", ["", None])
+def test_density_of_empty_text(text):
+    """Test density of empty text."""
+    assert _calculate_content_density(text) == 0.0
 
 
-class TestContentDensity(unittest.TestCase):
-    """Test content density calculation."""
-    
-    def test_empty_text(self):
-        """Test density of empty text."""
-        self.assertEqual(_calculate_content_density(""), 0.0)
-        self.assertEqual(_calculate_content_density(None), 0.0)
-    
-    def test_high_quality_content(self):
-        """Test density of high-quality article text."""
-        text = """
-        This is a well-written article with multiple sentences. It contains
-        valuable information that users are looking for. The content is
-        structured properly with good grammar and punctuation. This type
-        of content should score highly on density metrics.
-        """
-        density = _calculate_content_density(text)
-        self.assertGreater(density, 0.3)
-    
-    def test_low_quality_content(self):
-        """Test density of low-quality text (symbols, noise)."""
-        text = "!@#$%^&*()_+-=[]{}|;':\"<>?,./`~"
-        density = _calculate_content_density(text)
-        # Threshold of 0.4 accounts for the alphanumeric ratio component
-        # which still scores ~0.33 even for pure symbols due to sentence normalization
-        self.assertLess(density, 0.4)
-    
-    def test_mixed_content(self):
-        """Test density of mixed quality content."""
-        text = "Some text with @@@ symbols ### and numbers 12345 mixed in."
-        density = _calculate_content_density(text)
-        self.assertGreater(density, 0.0)
-        self.assertLess(density, 1.0)
-
-
-class TestRelevanceScore(unittest.TestCase):
-    """Test relevance scoring against queries."""
-    
-    def test_exact_match(self):
-        """Test exact query match in text."""
-        query = "machine learning"
-        text = "This article discusses machine learning and its applications."
-        score = _calculate_relevance_score(text, query)
-        self.assertGreater(score, 0.5)
-    
-    def test_partial_match(self):
-        """Test partial query match in text."""
-        query = "python programming tutorial"
-        text = "This is a tutorial about programming concepts and Python basics."
-        score = _calculate_relevance_score(text, query)
-        self.assertGreater(score, 0.2)
-    
-    def test_no_match(self):
-        """Test no query match in text."""
-        query = "quantum physics"
-        text = "This article is about cooking recipes and baking techniques."
-        score = _calculate_relevance_score(text, query)
-        self.assertLess(score, 0.2)
-    
-    def test_case_insensitive(self):
-        """Test that matching is case-insensitive."""
-        query = "JAVASCRIPT"
-        text = "Learning javascript is fun and rewarding for web developers."
-        score = _calculate_relevance_score(text, query)
-        self.assertGreater(score, 0.3)
-    
-    def test_position_matters(self):
-        """Test that earlier matches score higher."""
-        query = "climate change"
-        text1 = "Climate change is a critical issue. " + "Filler text. " * 50
-        text2 = "Filler text. " * 50 + "Climate change is mentioned here."
-        
-        score1 = _calculate_relevance_score(text1, query)
-        score2 = _calculate_relevance_score(text2, query)
-        
-        self.assertGreater(score1, score2)
+@pytest.mark.parametrize("text, above, below", [
+    # high-quality article text
+    (_QUALITY_TEXT, 0.3, None),
+    # symbols and noise; the alphanumeric ratio component still scores ~0.33
+    # even for pure symbols due to sentence normalization
+    ("!@#$%^&*()_+-=[]{}|;':\"<>?,./`~", None, 0.4),
+    # mixed quality
+    ("Some text with @@@ symbols ### and numbers 12345 mixed in.", 0.0, 1.0),
+])
+def test_density_range(text, above, below):
+    """Test density scores fall in the expected range."""
+    density = _calculate_content_density(text)
+    if above is not None:
+        assert density > above
+    if below is not None:
+        assert density < below
+
+
+@pytest.mark.parametrize("text", ["Some text_with @@@ symbols\t### and 12345!", "Café naïve — 東京 ½ ① _x_", ""])
+def test_alnum_space_count(text):
+    """Test the alphanumeric/whitespace counter on ASCII and Unicode text."""
+    assert _alnum_space_count(text) == sum(c.isalnum() or c.isspace() for c in text)
+
+
+@pytest.mark.parametrize("text, query, above, below", [
+    # exact query match
+    ("This article discusses machine learning and its applications.", "machine learning", 0.5, None),
+    # partial match
+    ("This is a tutorial about programming concepts and Python basics.", "python programming tutorial", 0.2, None),
+    # no match
+    ("This article is about cooking recipes and baking techniques.", "quantum physics", None, 0.2),
+    # matching is case-insensitive
+    ("Learning javascript is fun and rewarding for web developers.", "JAVASCRIPT", 0.3, None),
+])
+def test_relevance_range(text, query, above, below):
+    """Test relevance scores fall in the expected range."""
+    score = _calculate_relevance_score(text, query)
+    if above is not None:
+        assert score > above
+    if below is not None:
+        assert score < below
+
+
+def test_relevance_no_term_present_scores_zero():
+    """Test that text containing none of the query terms scores zero."""
+    text = "This article is about cooking recipes and baking techniques."
+    assert _calculate_relevance_score(text, "quantum physics") == 0.0
+
+
+@pytest.mark.parametrize("query, earlier, later", [
+    # earlier matches score higher
+    ("climate change",
+     "Climate change is a critical issue. " + "Filler text. " * 50,
+     "Filler text. " * 50 + "Climate change is mentioned here."),
+    # term frequency ignores terms embedded in longer words
+    ("python", "python " * 5, "pythonic " * 5),
+])
+def test_relevance_ordering(query, earlier, later):
+    """Test that the first text outranks the second."""
+    assert _calculate_relevance_score(earlier, query) > _calculate_relevance_score(later, query)
+
+
+def test_relevance_precomputed_query_terms():
+    """Test that passing precomputed query terms gives the same score."""
+    query = "Python programming tutorial"
+    text = "This is a tutorial about programming concepts and Python basics."
+    assert _calculate_relevance_score(text, query, _query_terms(query)) == _calculate_relevance_score(text, query)
 
 
 class TestEnhancedExtraction(unittest.TestCase):
@@ -219,22 +456,8 @@ class TestEnhancedExtraction(unittest.TestCase):
     
     def test_extracts_main_content(self):
         """Test extraction of main article content."""
-        html = """
-        <html>
-            <head><title>Test Article</title></head>
-            <body>
-                <nav><a href="#">Menu</a></nav>
-                <article>
-                    <h1>Article Title</h1>
-                    <p>This is the main content of the article with important information.</p>
-                    <p>It has multiple paragraphs with detailed explanations and analysis.</p>
-                </article>
-                <footer>Copyright notice</footer>
-            </body>
-        </html>
-        """
         query = "article information"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_ARTICLE, "http://example.com", query)
         
         self.assertIsNotNone(result)
         self.assertIn('main content', result)
@@ -256,12 +479,9 @@ class TestEnhancedExtraction(unittest.TestCase):
     
     def test_respects_character_limit(self):
         """Test that extraction respects the character limit."""
-        # Create very long HTML
-        long_content = "<p>" + ("This is a long paragraph. " * 1000) + "</p>"
-        html = f"<html><body><article>{long_content}</article></body></html>"
         query = "paragraph"
         
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(LONG_PARAGRAPH_HTML, "http://example.com", query)
         
         if result:
             # Should not exceed EXTRACT_MAX_CHARS (9000 in default config)
@@ -269,62 +489,532 @@ class TestEnhancedExtraction(unittest.TestCase):
     
     def test_prioritizes_relevant_content(self):
         """Test that more relevant content is prioritized."""
-        html = """
-        <html>
-            <body>
-                <article>
-                    <section>
-                        <p>Irrelevant content about something completely different that has nothing to do with the query.</p>
-                        <p>More filler text that is not relevant at all to what the user is searching for.</p>
-                    </section>
-                    <section>
-                        <p>Python programming is a powerful skill. Python is used for web development, data science, and automation.</p>
-                        <p>Learning Python can open many career opportunities in software development.</p>
-                    </section>
-                </article>
-            </body>
-        </html>
-        """
         query = "python programming"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_RELEVANCE, "http://example.com", query)
         
         self.assertIsNotNone(result)
         self.assertIn('Python', result)
         # Should prioritize relevant content
         self.assertGreater(result.find('Python'), -1)
+    
+    def test_regex_blocks_strip_markup(self):
+        """Test that the regex scan strips nested tags and entities."""
+        html = (
+            "<pre>code block that is long enough to count as content here</pre>"
+            "<p class='x'>Fish &amp; chips are <b>a classic</b> British dish served hot.</p>"
+            "<li>too short</li>"
+        )
+        self.assertEqual(
+            _regex_content_blocks(html),
+            ["Fish & chips are a classic British dish served hot."],
+        )
+    
+    def test_regex_blocks_unclosed_tags(self):
+        """Test that unclosed <p>/<li> don't swallow the page (or scan it once per opener)."""
+        closed = "A closed paragraph at the end that is long enough to be kept."
+        html = "<li>unclosed list item" * 3000 + "<p>unclosed paragraph text" * 3000 + f"<p>{closed}</p>"
+        self.assertEqual(_regex_content_blocks(html), [closed])
+    
+    def test_regex_fast_path_falls_through_when_short(self):
+        """Test that the regex fast path is used for long pages and skipped for short ones."""
+        long_html = "<p>" + "Python programming guide with worked examples. " * 20 + "</p>"
+        short_html = "<div><div>Python programming guide with worked examples and notes.</div></div>"
+        
+        with patch.object(ai_summarize_select_fetch, "REGEX_EXTRACT", True), \
+                patch.object(ai_summarize_select_fetch, "_parse_content_blocks",
+                             wraps=ai_summarize_select_fetch._parse_content_blocks) as parse:
+            self.assertIn("worked examples", _extract_enhanced(long_html, "http://example.com", "python"))
+            parse.assert_not_called()
+            _extract_enhanced(short_html, "http://example.com", "python")
+            parse.assert_called_once()
+
+
+@pytest.mark.parametrize("raw, cleaned", [
+    ("  hello   world  ", "hello world"),
+    ("hello\n\nworld", "hello world"),
+    ("  \t \n  ", ""),
+])
+def test_clean_whitespace(raw, cleaned):
+    """Test whitespace cleaning."""
+    assert _clean(raw) == cleaned
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("http://example.com", True),
+    ("https://example.com", True),
+    ("ftp://example.com", False),
+    ("//example.com", False),
+    ("example.com", False),
+])
+def test_is_http(url, expected):
+    """Test HTTP URL detection."""
+    assert _is_http(url) is expected
+
+
+def test_strip_trigger(monkeypatch):
+    """Test trigger stripping."""
+    # monkeypatch restores the module global even if an assertion fails,
+    # so tests stay independent when distributed across xdist workers
+    monkeypatch.setattr(ai_summarize_select_fetch, "TRIGGER", "!!sum")
+    
+    assert _strip_trigger("best laptop !!sum") == "best laptop"
+    assert _strip_trigger("!!sum python tutorial") == "python tutorial"
 
 
-class TestUtilityFunctions(unittest.TestCase):
-    """Test utility functions."""
+class TestLocalSelection(unittest.TestCase):
+    """Test LLM-free URL selection from search snippets."""
     
-    def test_clean_whitespace(self):
-        """Test whitespace cleaning."""
-        self.assertEqual(_clean("  hello   world  "), "hello world")
-        self.assertEqual(_clean("hello\n\nworld"), "hello world")
-        self.assertEqual(_clean("  \t \n  "), "")
+    @staticmethod
+    def _result(url, title, content):
+        return Mock(url=url, title=title, content=content)
     
-    def test_is_http(self):
-        """Test HTTP URL detection."""
-        self.assertTrue(_is_http("http://example.com"))
-        self.assertTrue(_is_http("https://example.com"))
-        self.assertFalse(_is_http("ftp://example.com"))
-        self.assertFalse(_is_http("//example.com"))
-        self.assertFalse(_is_http("example.com"))
+    def test_ranks_relevant_snippets_first(self):
+        """Test that snippets matching the query are selected first."""
+        results = [
+            self._result("https://a.example/cooking", "Cooking recipes", "How to bake bread at home."),
+            self._result("https://b.example/python", "Python programming", "Learn python programming basics."),
+        ]
+        selected = local_select_urls(_build_candidates("python programming", results))
+        self.assertEqual(selected[0], "https://b.example/python")
+        self.assertEqual(len(selected), 2)
     
-    def test_strip_trigger(self):
-        """Test trigger stripping."""
-        # Assuming default trigger is "!!sum"
-        import ai_summarize_select_fetch
-        original_trigger = ai_summarize_select_fetch.TRIGGER
-        ai_summarize_select_fetch.TRIGGER = "!!sum"
+    def test_one_url_per_host(self):
+        """Test that only one URL per hostname is selected."""
+        results = [
+            self._result("https://example.com/a", "Python guide", "python tutorial"),
+            self._result("https://EXAMPLE.com/b", "Python docs", "python reference"),
+            self._result("https://other.org/c", "Python", "python"),
+        ]
+        selected = local_select_urls(_build_candidates("python", results))
+        self.assertEqual(selected, ["https://example.com/a", "https://other.org/c"])
+    
+    def test_skips_non_http_urls(self):
+        """Test that non-HTTP results are ignored."""
+        results = [
+            self._result("ftp://example.com/file", "Python", "python"),
+            self._result("", "Python", "python"),
+        ]
+        self.assertEqual(_build_candidates("python", results), [])
+    
+    def test_skips_malformed_urls(self):
+        """Test that a result URL urlsplit can't parse is skipped, not fatal."""
+        results = [
+            self._result("http://[bad/", "Python", "python"),
+            self._result("https://ok.example/", "Python", "python"),
+        ]
+        self.assertEqual([c.url for c in _build_candidates("python", results)], ["https://ok.example/"])
+    
+    def test_candidates_precompute_fields(self):
+        """Test that candidates carry host, cleaned text and score."""
+        results = [self._result("https://Docs.Example.com/x?y=1", "  Python\n docs ", "python   reference")]
+        candidate = _build_candidates("python", results)[0]
+        self.assertEqual(candidate.host, "docs.example.com")
+        self.assertEqual(candidate.title, "Python docs")
+        self.assertEqual(candidate.snippet, "python reference")
+        self.assertGreater(candidate.score, 0.0)
+    
+    def test_credible_host_breaks_ties(self):
+        """Test that equally relevant snippets favour a credible host."""
+        results = [
+            self._result("https://blog.example/python", "Python", "python language"),
+            self._result("https://en.wikipedia.org/wiki/Python", "Python", "python language"),
+        ]
+        selected = local_select_urls(_build_candidates("python", results))
+        self.assertEqual(selected[0], "https://en.wikipedia.org/wiki/Python")
+
+
+class TestBackgroundLoop(unittest.TestCase):
+    """Test the shared background event loop."""
+    
+    def test_threads_share_one_loop_and_client(self):
+        """Test that calls from different threads run on the same loop and client."""
+        async def where(client):
+            return asyncio.get_running_loop(), client
+        
+        seen = []
+        threads = [
+            threading.Thread(target=lambda: seen.append(ai_summarize_select_fetch._run_in_loop(where, timeout=5)))
+            for _ in range(3)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(len(set(seen)), 1)
+        self.assertIsNot(seen[0][0], None)
+    
+    def test_timeout_cancels_coroutine(self):
+        """Test that a timed-out run is cancelled on the loop."""
+        cancelled = threading.Event()
+        
+        async def slow(client):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            ai_summarize_select_fetch._run_in_loop(slow, timeout=0.05)
+        self.assertTrue(cancelled.wait(1))
+
+
+class TestChatCoalescing(unittest.TestCase):
+    """Test that identical concurrent prompts share one LLM request."""
+    
+    def test_concurrent_identical_prompts_make_one_request(self):
+        """Test that two threads asking the same prompt hit the API once."""
+        calls = []
+        
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={"choices": [{"message": {"content": " answer "}}]})
+        
+        answers = []
+        
+        def ask():
+            async def run():
+                async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                    return await _openai_chat(client, "same prompt", timeout=5)
+            answers.append(asyncio.run(run()))
+        
+        threads = [threading.Thread(target=ask) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(answers, ["answer", "answer"])
+
+
+class TestChatCache(unittest.TestCase):
+    """Test the LRU+TTL cache in front of the LLM."""
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = _TTLCache(maxsize=2, ttl=60)
+        cache.set(b"a", "1")
+        cache.set(b"b", "2")
+        cache.get(b"a")
+        cache.set(b"c", "3")
+        self.assertEqual(cache.get(b"a"), "1")
+        self.assertIsNone(cache.get(b"b"))
+        self.assertEqual(cache.get(b"c"), "3")
+    
+    def test_entries_expire(self):
+        """Test that entries are dropped after the TTL."""
+        cache = _TTLCache(maxsize=2, ttl=0)
+        cache.set(b"a", "1")
+        self.assertIsNone(cache.get(b"a"))
+    
+    def test_repeated_prompt_served_from_cache(self):
+        """Test that a repeated prompt does not call the API again."""
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "cached answer"}}]})
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                first = await _openai_chat(client, "cache me", timeout=5)
+                second = await _openai_chat(client, "cache me", timeout=5)
+            return first, second
+        
+        self.assertEqual(asyncio.run(run()), ("cached answer", "cached answer"))
+        self.assertEqual(len(calls), 1)
+
+
+class TestLLMSelection(unittest.TestCase):
+    """Test URL selection through the LLM."""
+    
+    def test_parses_selected_urls(self):
+        """Test that non-ASCII candidates reach the prompt and URLs are parsed."""
+        prompts = []
+        
+        def handler(request):
+            prompts.append(json.loads(request.content)["messages"][1]["content"])
+            content = json.dumps({"urls": ["https://b.com/", "https://a.com/", "https://a.com/", "ftp://x"]})
+            return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+        
+        results = [
+            Mock(url="https://a.com/", title="Crème brûlée", content="Classic dessert recipe"),
+            Mock(url="https://b.com/", title="Brûlée history", content="Origins of the dish"),
+        ]
+        candidates = _build_candidates("crème brûlée", results)
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await llm_select_urls(client, "crème brûlée", candidates)
+        
+        self.assertEqual(asyncio.run(run()), ["https://b.com/", "https://a.com/"])
+        self.assertIn("Crème brûlée", prompts[0])
+
+
+class TestFetchAndExtract(unittest.TestCase):
+    """Test page fetching and extraction."""
+    
+    @staticmethod
+    def _fetch(handler, url="https://example.com/page"):
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await fetch_and_extract(client, url, "python programming")
+        return asyncio.run(run())
+    
+    def test_stops_reading_at_max_bytes(self):
+        """Test that the body is streamed only up to FETCH_MAX_BYTES."""
+        paragraph = b"<p>" + b"Python programming is a useful skill to learn. " * 340 + b"</p>"
+        chunks_read = []
+        
+        async def body():
+            for i in range(100):
+                chunks_read.append(i)
+                yield paragraph
+        
+        def handler(request):
+            return httpx.Response(200, content=body())
+        
+        with patch.object(ai_summarize_select_fetch, "FETCH_MAX_BYTES", 32 * 1024):
+            url, text = self._fetch(handler)
+        
+        self.assertIsNotNone(text)
+        self.assertIn("Python programming", text)
+        self.assertLess(len(chunks_read), 10)
+    
+    def test_decodes_with_response_charset(self):
+        """Test that the Content-Type charset is used to decode the page."""
+        html = "<html><body><p>Python programming ist großartig und sehr nützlich für Anfänger.</p></body></html>"
+        
+        def handler(request):
+            return httpx.Response(
+                200,
+                content=html.encode("latin-1"),
+                headers={"Content-Type": "text/html; charset=iso-8859-1"},
+            )
+        
+        url, text = self._fetch(handler)
+        self.assertIn("großartig", text)
+    
+    def test_http_error_returns_none(self):
+        """Test that HTTP errors are swallowed."""
+        url, text = self._fetch(lambda request: httpx.Response(404))
+        self.assertEqual(url, "https://example.com/page")
+        self.assertIsNone(text)
+    
+    def test_extracts_off_the_event_loop_thread(self):
+        """Test that CPU-bound extraction doesn't run on the shared loop thread."""
+        loop_thread = threading.get_ident()
+        extract_threads = []
         
-        result = _strip_trigger("best laptop !!sum")
-        self.assertEqual(result, "best laptop")
+        def extract(html, url, query):
+            extract_threads.append(threading.get_ident())
+            return "Python programming is a useful skill to learn."
         
-        result = _strip_trigger("!!sum python tutorial")
-        self.assertEqual(result, "python tutorial")
+        with patch.object(ai_summarize_select_fetch, "_extract_enhanced", side_effect=extract):
+            url, text = self._fetch(lambda request: httpx.Response(200, text="<p>page</p>"))
         
-        ai_summarize_select_fetch.TRIGGER = original_trigger
+        self.assertEqual(text, "Python programming is a useful skill to learn.")
+        self.assertEqual(len(extract_threads), 1)
+        self.assertNotEqual(extract_threads[0], loop_thread)
+
+
+class TestFetchPages(unittest.TestCase):
+    """Test parallel page fetching limits."""
+    
+    def test_limits_concurrency_per_host_and_overall(self):
+        """Test that fetches respect the global and per-host limits."""
+        active = {"all": 0, "same.example": 0}
+        peak = {"all": 0, "same.example": 0}
+        
+        async def handler(request):
+            keys = ["all"] + ([request.url.host] if request.url.host in active else [])
+            for k in keys:
+                active[k] += 1
+                peak[k] = max(peak[k], active[k])
+            await asyncio.sleep(0.05)
+            for k in keys:
+                active[k] -= 1
+            return httpx.Response(404)
+        
+        urls = [f"https://same.example/{i}" for i in range(5)]
+        urls += [f"https://host{i}.example/" for i in range(5)]
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await fetch_pages(client, urls, "query")
+        
+        with patch.object(ai_summarize_select_fetch, "FETCH_CONCURRENCY", 4), \
+                patch.object(ai_summarize_select_fetch, "FETCH_PER_HOST", 2):
+            self.assertEqual(asyncio.run(run()), [])
+        
+        self.assertLessEqual(peak["all"], 4)
+        self.assertLessEqual(peak["same.example"], 2)
+    
+    def test_unparseable_url_does_not_abort_the_batch(self):
+        """Test that a malformed URL fails alone and the other pages are kept."""
+        page = "<html><body><p>" + "Python programming is a useful skill to learn. " * 5 + "</p></body></html>"
+        
+        def handler(request):
+            return httpx.Response(200, text=page)
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await fetch_pages(client, ["https://ok.example/", "http://[bad/"], "python programming")
+        
+        extracted = asyncio.run(run())
+        self.assertEqual([u for u, _ in extracted], ["https://ok.example/"])
+
+
+class TestSpeculativePrefetch(unittest.TestCase):
+    """Test overlapping LLM selection with fetching the local picks."""
+    
+    def test_prefetches_local_picks_during_llm_selection(self):
+        """Test that local picks are fetched early and reused, not refetched."""
+        events = []
+        
+        async def handler(request):
+            if request.url.path.endswith("/chat/completions"):
+                prompt = json.loads(request.content)["messages"][1]["content"]
+                if "Search results:" in prompt:
+                    await asyncio.sleep(0.1)
+                    events.append("selected")
+                    content = json.dumps({"urls": ["https://c.example/", "https://a.example/"]})
+                else:
+                    content = "summary"
+                return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+            events.append(str(request.url))
+            return httpx.Response(404)
+        
+        results = [
+            Mock(url="https://a.example/", title="Speculative python guide", content="A python guide"),
+            Mock(url="https://b.example/", title="Python guide basics", content="Another python guide"),
+            Mock(url="https://c.example/", title="Cooking", content="Recipes and baking"),
+        ]
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await summarize_pipeline(client, "speculative python guide", results)
+        
+        with patch.object(ai_summarize_select_fetch, "LLM_SELECT", True), \
+                patch.object(ai_summarize_select_fetch, "FETCH_K", 2):
+            self.assertEqual(asyncio.run(run()), "summary")
+        
+        self.assertEqual(events.count("https://a.example/"), 1)
+        self.assertEqual(events.count("https://c.example/"), 1)
+        self.assertLess(events.index("https://a.example/"), events.index("selected"))
+        self.assertGreater(events.index("https://c.example/"), events.index("selected"))
+    
+    def test_reuses_selection_for_same_query_and_hosts(self):
+        """Test that a repeated query over the same hosts skips the selection call."""
+        prompts = []
+        
+        def handler(request):
+            if request.url.path.endswith("/chat/completions"):
+                prompt = json.loads(request.content)["messages"][1]["content"]
+                prompts.append(prompt)
+                if "Search results:" in prompt:
+                    content = json.dumps({"urls": ["https://b.example/"]})
+                else:
+                    content = f"summary {len(prompts)}"
+                return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+            return httpx.Response(404)
+        
+        def results(snippet):
+            return [
+                Mock(url="https://a.example/", title="Memo guide", content=snippet),
+                Mock(url="https://b.example/", title="Memo basics", content=snippet),
+            ]
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                await summarize_pipeline(client, "memo guide", results("first snippet"))
+                # different snippets change the prompt, but not the hosts
+                await summarize_pipeline(client, "Memo  Guide", results("second snippet"))
+        
+        with patch.object(ai_summarize_select_fetch, "LLM_SELECT", True):
+            asyncio.run(run())
+        
+        self.assertEqual(sum("Search results:" in p for p in prompts), 1)
+    
+    def test_abandoned_pipeline_cancels_prefetches(self):
+        """Test that speculative fetches stop when the pipeline is cancelled mid-selection."""
+        started, cancelled = [], []
+        
+        async def handler(request):
+            if request.url.path.endswith("/chat/completions"):
+                await asyncio.sleep(10)
+            started.append(str(request.url))
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(str(request.url))
+                raise
+            return httpx.Response(404)
+        
+        results = [
+            Mock(url="https://a.example/", title="Abandoned query guide", content="An abandoned query guide"),
+            Mock(url="https://b.example/", title="Abandoned query basics", content="More on abandoned queries"),
+        ]
+        
+        async def run():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(summarize_pipeline(client, "abandoned query", results), 0.2)
+                # let the cancellations land; asyncio.run() would cancel
+                # leftovers at shutdown anyway, so check before it does
+                await asyncio.sleep(0.05)
+                return sorted(cancelled)
+        
+        with patch.object(ai_summarize_select_fetch, "LLM_SELECT", True):
+            cancelled_in_loop = asyncio.run(run())
+        
+        self.assertEqual(sorted(started), ["https://a.example/", "https://b.example/"])
+        self.assertEqual(cancelled_in_loop, sorted(started))
+
+
+class TestContentDedupe(unittest.TestCase):
+    """Test removal of duplicate extracted pages."""
+    
+    def test_drops_syndicated_copies(self):
+        """Test that copies differing only in case/punctuation are dropped."""
+        extracted = [
+            ("https://a.example/story", "Breaking: the news, as reported today."),
+            ("https://b.example/story", "BREAKING the news  as reported today"),
+            ("https://c.example/other", "A completely different article."),
+        ]
+        self.assertEqual(
+            [u for u, _ in _dedupe_by_content(extracted)],
+            ["https://a.example/story", "https://c.example/other"],
+        )
+
+
+class TestTokenBudget(unittest.TestCase):
+    """Test trimming of summarizer sources to a token budget."""
+    
+    def test_short_sources_kept_whole(self):
+        """Test that sources already within budget are untouched."""
+        extracted = [("https://a.example", "short text"), ("https://b.example", "also short")]
+        self.assertEqual(_fit_token_budget(extracted, 100), extracted)
+    
+    def test_leftover_budget_goes_to_long_sources(self):
+        """Test that long sources share what short ones don't use."""
+        chars_per_token = ai_summarize_select_fetch.CHARS_PER_TOKEN
+        extracted = [
+            ("https://long.example", "x" * 10000),
+            ("https://short.example", "y" * 100),
+            ("https://long2.example", "z" * 10000),
+        ]
+        fitted = _fit_token_budget(extracted, 1000)
+        
+        self.assertEqual([u for u, _ in fitted], [u for u, _ in extracted])
+        self.assertEqual(fitted[1][1], "y" * 100)
+        total = sum(len(t) for _, t in fitted)
+        self.assertLessEqual(total, 1000 * chars_per_token + len(fitted))
+        self.assertEqual(len(fitted[0][1]), len(fitted[2][1]))
+        self.assertGreater(len(fitted[0][1]), (1000 * chars_per_token) // 3)
 
 
 class TestEdgeCases(unittest.TestCase):
@@ -332,24 +1022,8 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_javascript_heavy_page(self):
         """Test page with lots of JavaScript (should be filtered)."""
-        html = """
-        <html>
-            <body>
-                <script>
-                    function doSomething() {
-                        var x = 1;
-                        console.log(x);
-                    }
-                </script>
-                <article>
-                    <p>This is the actual content that should be extracted from the page.</p>
-                </article>
-                <script>moreJavaScript();</script>
-            </body>
-        </html>
-        """
         query = "content"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_JS_HEAVY, "http://example.com", query)
         
         if result:
             self.assertNotIn('function', result)
@@ -357,83 +1031,24 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_blog_format(self):
         """Test typical blog page format."""
-        html = """
-        <html>
-            <body>
-                <header>
-                    <nav>Home | About | Contact</nav>
-                </header>
-                <main>
-                    <article>
-                        <h1>Blog Post Title</h1>
-                        <p>This is the introduction paragraph of the blog post with interesting content.</p>
-                        <p>The body of the blog post continues with more detailed information and analysis.</p>
-                    </article>
-                    <aside class="sidebar">
-                        <div class="widget">Recent Posts</div>
-                        <div class="ad-widget">Advertisement</div>
-                    </aside>
-                </main>
-                <footer>Blog footer</footer>
-            </body>
-        </html>
-        """
         query = "blog post"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_BLOG, "http://example.com", query)
         
         self.assertIsNotNone(result)
         self.assertIn('introduction', result.lower())
     
     def test_news_article_format(self):
         """Test news article format."""
-        html = """
-        <html>
-            <body>
-                <article class="news-article">
-                    <h1>Breaking News Headline</h1>
-                    <div class="byline">By Reporter Name</div>
-                    <p>The first paragraph of the news article contains the most important information.</p>
-                    <p>Subsequent paragraphs provide additional context and details about the event.</p>
-                    <p>Expert quotes and analysis are included in later paragraphs.</p>
-                </article>
-                <div class="related-articles">
-                    <h3>Related Stories</h3>
-                    <a href="#">Other news</a>
-                </div>
-            </body>
-        </html>
-        """
         query = "news"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_NEWS, "http://example.com", query)
         
         self.assertIsNotNone(result)
         self.assertIn('important information', result)
     
     def test_ecommerce_page(self):
         """Test e-commerce product page."""
-        html = """
-        <html>
-            <body>
-                <nav>Categories | Cart | Account</nav>
-                <main>
-                    <div class="product">
-                        <h1>Product Name</h1>
-                        <p class="description">This product is perfect for users who need high-quality solutions.</p>
-                        <div class="specs">
-                            <p>Specifications: Premium quality, durable construction, easy to use.</p>
-                        </div>
-                    </div>
-                    <div class="reviews">
-                        <h2>Customer Reviews</h2>
-                        <p>Great product! Works as advertised and exceeds expectations.</p>
-                    </div>
-                </main>
-                <div class="recommendations">You might also like...</div>
-            </body>
-        </html>
-        """
         query = "product quality"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_ECOMMERCE, "http://example.com", query)
         
         # Should extract product description
         if result:
@@ -441,29 +1056,8 @@ class TestEdgeCases(unittest.TestCase):
     
     def test_wikipedia_style_page(self):
         """Test Wikipedia-style reference page."""
-        html = """
-        <html>
-            <body>
-                <div id="content">
-                    <h1>Article Subject</h1>
-                    <p>The article subject is an important topic in computer science and technology.</p>
-                    <section>
-                        <h2>History</h2>
-                        <p>The history section provides background information and context about the development.</p>
-                    </section>
-                    <section>
-                        <h2>Technical Details</h2>
-                        <p>Technical details explain how the system works and its key components.</p>
-                    </section>
-                </div>
-                <div id="footer">
-                    <p>This page was last edited on...</p>
-                </div>
-            </body>
-        </html>
-        """
         query = "technical details"
-        result = _extract_enhanced(html, "http://example.com", query)
+        result = _extract_cached(HTML_WIKI, "http://example.com", query)
         
         self.assertIsNotNone(result)
         self.assertIn('Technical', result)